@@ -0,0 +1,283 @@
+"""端到端 agent 性能基准：在固定查询集上运行 ReActTravelAgent.plan_trip，统计每个计划的步数、LLM 调用次数、
+token 数、LLM/工具/解析/上下文裁剪各阶段耗时，以及计划时延的 p50/p95/p99，结果写成 JSON 便于在不同提交间对比。
+
+查询集：CITY_MAP 中每个城市、每个难度（Easy/Medium/Hard）各取 travel_queries.csv 中的前 --per_level 条。
+LLM 后端：
+- mock：按查询的结构化字段生成固定的工具调用脚本（查景点→初始化笔记本→逐日查餐厅/酒店/交通并写入→输出），
+  不访问网络，度量的是 agent 循环和工具本身的开销；
+- platform：使用 --platform/--model_name 的真实调用，可配合录制/回放服务复现固定的 LLM 回复，例如
+    vLLM_BASE_URL=http://localhost:23200/v1 python benchmark/bench_agent.py --llm=platform
+工具默认使用离线交通估计（--transport_mode=offline）。
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform as py_platform
+import subprocess
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from config import CITY_MAP, OBSERVATION_ENCODING
+from context import CONTEXT_STRATEGIES, count_tokens
+from poi_store import get_poi_store
+from query_generation import DIFFICULTY_CONFIG
+from travel_agent import ReActTravelAgent, STEP_MODES
+from tools import set_transport_mode, TRANSPORT_MODES, set_observation_encoding, OBSERVATION_ENCODINGS
+from travel_bench.trip_eval import parse_preference
+
+PHASES = ['llm', 'tools', 'parse', 'prune']
+MEALS = ['breakfast', 'lunch', 'dinner']
+
+
+class ScriptedLLM:
+    """按查询预先生成整条工具调用脚本；react 模式下 Thought 调用返回文本，Action 调用依次返回脚本中的工具调用。
+    token 数按实际发送的消息估算，与真实调用的统计口径一致。"""
+
+    def __init__(self, record, city_en):
+        self.model_name = 'mock'
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cache_hits": 0}
+        self.script = build_script(record, city_en)
+        self.cursor = 0
+        self._tools_tokens = None
+        self.last_usage = None
+
+    def get_response(self, messages, tools, max_tokens=1024, temperature=0., get_json=False):
+        self.usage["calls"] += 1
+        prompt_tokens = sum(count_tokens(msg['content']) for msg in messages)
+        if tools:
+            if self._tools_tokens is None:
+                self._tools_tokens = count_tokens(json.dumps(tools, ensure_ascii=False))
+            prompt_tokens += self._tools_tokens
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.last_usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 0}
+
+        tool_name, tool_args = self.script[min(self.cursor, len(self.script) - 1)]
+        thought = f"接下来调用{tool_name}。"
+        if not tools:
+            self.last_usage["completion_tokens"] = count_tokens(thought)
+            self.usage["completion_tokens"] += self.last_usage["completion_tokens"]
+            return {"type": "message", "content": thought}
+        self.cursor += 1
+        raw_args = json.dumps(tool_args, ensure_ascii=False)
+        self.last_usage["completion_tokens"] = count_tokens(tool_name + raw_args)
+        self.usage["completion_tokens"] += self.last_usage["completion_tokens"]
+        return {"type": "tool_call", "tool_name": tool_name, "tool_args": raw_args, "content": thought}
+
+
+def pick(records, used):
+    for record in records:
+        if record['name'] not in used:
+            used.add(record['name'])
+            return record
+    return records[0] if records else None
+
+
+def build_script(record, city_en):
+    store = get_poi_store(city_en)
+    city_zh = CITY_MAP[city_en]
+    days = int(record['days'])
+    start = datetime.strptime(str(record['date']), "%Y-%m-%d")
+    dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    preference = parse_preference(record.get('preference_constraint')) or {}
+    cuisines = preference.get('cuisines') or None
+    hotel_type = preference.get('hotel') or None
+    if isinstance(cuisines, str):
+        cuisines = [cuisines]
+
+    attractions = [a for a in store.attractions()
+                   if len(store.nearby_restaurants(a['name'])) >= len(MEALS) and store.nearby_hotels(a['name'])]
+    script = [("AttractionSearch", {"city_name": city_zh}),
+              ("NotebookInit", {"dates": dates, "num_people": int(record['people_number'])})]
+    used = set()
+    for day, date in enumerate(dates):
+        visit = [attractions[(2 * day + i) % len(attractions)] for i in range(2)]
+        first, second = visit[0]['name'], visit[1]['name']
+
+        restaurant_args = {"attraction": first, "city_name": city_zh}
+        restaurants = store.nearby_restaurants(first, cuisines) if cuisines else []
+        if restaurants:
+            restaurant_args["cuisine_category"] = cuisines
+        else:
+            restaurants = store.nearby_restaurants(first)
+        hotel_args = {"attraction": second, "city_name": city_zh}
+        hotels = store.nearby_hotels(second, [hotel_type]) if hotel_type else []
+        if hotels:
+            hotel_args["hotel_type"] = hotel_type
+        else:
+            hotels = store.nearby_hotels(second)
+
+        script += [("NearbyRestaurantSearch", restaurant_args),
+                   ("NearbyHotelSearch", hotel_args),
+                   ("TransportationSearch", {"org": first, "dest": second, "city_name": city_zh}),
+                   ("NotebookWrite", {"date": date, "info_class": "attraction",
+                                      "data": [{"name": a['name'], "cost": a['cost']} for a in visit]})]
+        for meal in MEALS:
+            restaurant = pick(restaurants, used)
+            script.append(("NotebookWrite", {"date": date, "info_class": meal,
+                                             "data": {"name": restaurant['name'], "keytag": restaurant['keytag'],
+                                                      "cost": restaurant['cost']}}))
+        hotel = hotels[0]
+        script += [("NotebookWrite", {"date": date, "info_class": "accommodation",
+                                      "data": {"name": hotel['name'], "keytag": hotel['keytag'], "cost": hotel['cost']}}),
+                   ("NotebookWrite", {"date": date, "info_class": "transportation",
+                                      "data": {f"{first}-{second}": f"从{first}出发前往{second}", "cost": 0}})]
+    script.append(("PlanOutput", {}))
+    return script
+
+
+def timed(func, timings, phase):
+    def wrapper(*args, **kwargs):
+        t1 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[phase] += time.perf_counter() - t1
+    return wrapper
+
+
+class TimedLLM:
+    def __init__(self, llm, timings):
+        self.llm = llm
+        self.model_name = llm.model_name
+        self.usage = llm.usage
+        self.get_response = timed(llm.get_response, timings, 'llm')
+
+    @property
+    def last_usage(self):
+        return getattr(self.llm, 'last_usage', None)
+
+
+def instrument(agent, timings):
+    agent.llm = TimedLLM(agent.llm, timings)
+    agent.tools = {name: timed(func, timings, 'tools') for name, func in agent.tools.items()}
+    agent.parse_tool_call_from_message = timed(agent.parse_tool_call_from_message, timings, 'parse')
+    agent.format_thought = timed(agent.format_thought, timings, 'parse')
+    agent.context.before_step = timed(agent.context.before_step, timings, 'prune')
+    agent.context.build = timed(agent.context.build, timings, 'prune')
+
+
+def run_plan(args, city_en, level, idx, record):
+    agent = ReActTravelAgent(args.platform, args.model_name, step_mode=args.step_mode, context_strategy=args.context,
+                             notebook_validation=args.notebook_validation, city_en=city_en)
+    if args.llm == 'mock':
+        agent.llm = ScriptedLLM(record, city_en)
+    timings = dict.fromkeys(PHASES, 0.)
+    instrument(agent, timings)
+
+    t1 = time.perf_counter()
+    try:
+        budget = (parse_preference(record.get('preference_constraint')) or {}).get('budget') if args.notebook_validation else None
+        agent.plan_trip(record['query'], budget=budget)
+        status = 'finished' if agent.finished else 'halted'
+    except Exception as e:
+        print(f'[{city_en}/{level}] PLAN {idx} 失败：{e}')
+        status = 'error'
+    wall_time = time.perf_counter() - t1
+    timings['other'] = max(wall_time - sum(timings.values()), 0.)
+    return {
+        "city": city_en,
+        "level": level,
+        "idx": int(idx),
+        "status": status,
+        "steps": agent.step_n - 1,
+        "calls": agent.llm.usage["calls"],
+        "prompt_tokens": agent.llm.usage["prompt_tokens"],
+        "completion_tokens": agent.llm.usage["completion_tokens"],
+        "wall_time": wall_time,
+        "phases": timings,
+        "notebook_violations": len(agent.notebook.violations),
+    }
+
+
+def summarize(plans):
+    if not plans:
+        return {}
+    latency = np.array([p["wall_time"] for p in plans])
+    phase_totals = {phase: float(sum(p["phases"][phase] for p in plans)) for phase in PHASES + ['other']}
+    total = max(float(latency.sum()), 1e-12)
+    summary = {
+        "plans": len(plans),
+        "finished": sum(p["status"] == 'finished' for p in plans),
+        "latency_p50": float(np.percentile(latency, 50)),
+        "latency_p95": float(np.percentile(latency, 95)),
+        "latency_p99": float(np.percentile(latency, 99)),
+        "latency_mean": float(latency.mean()),
+        "phase_time": phase_totals,
+        "phase_share": {phase: t / total for phase, t in phase_totals.items()},
+    }
+    for k in ["steps", "calls", "prompt_tokens", "completion_tokens"]:
+        summary[f"{k}_per_plan"] = float(np.mean([p[k] for p in plans]))
+    return summary
+
+
+def load_queries(cities, per_level):
+    queries = []
+    for city_en in cities:
+        query_df = pd.read_csv(f'database/{city_en}/travel_queries.csv')
+        for level in DIFFICULTY_CONFIG:
+            level_df = query_df[query_df['level'] == level].iloc[:per_level]
+            queries += [(city_en, level, idx, record) for idx, record in zip(level_df.index, level_df.to_dict(orient='records'))]
+    return queries
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', type=str, nargs='+', default=list(CITY_MAP))
+    parser.add_argument('--per_level', type=int, default=3, help='每个城市每个难度取的查询数')
+    parser.add_argument('--llm', type=str, default='mock', choices=['mock', 'platform'])
+    parser.add_argument('--platform', type=str, default='vLLM')
+    parser.add_argument('--model_name', type=str, default='citygpt-t-beijing')
+    parser.add_argument('--step_mode', type=str, default='react', choices=STEP_MODES)
+    parser.add_argument('--context', type=str, default='prune', choices=list(CONTEXT_STRATEGIES))
+    parser.add_argument('--transport_mode', type=str, default='offline', choices=TRANSPORT_MODES)
+    parser.add_argument('--obs_encoding', type=str, default=OBSERVATION_ENCODING, choices=OBSERVATION_ENCODINGS)
+    parser.add_argument('--notebook_validation', action='store_true')
+    parser.add_argument('--output', type=str, default='output/bench_agent.json')
+    args = parser.parse_args()
+    set_transport_mode(args.transport_mode)
+    set_observation_encoding(args.obs_encoding)
+    if args.llm == 'mock':
+        os.environ.setdefault(f'{args.platform}_API_KEY', 'EMPTY')  # mock 模式不会发出请求
+
+    queries = load_queries(args.cities, args.per_level)
+    for city_en in args.cities:  # 预先加载 POI 数据，避免首个计划的时延包含冷启动
+        for table in ['attraction', 'restaurant', 'hotel']:
+            get_poi_store(city_en).names(table)
+
+    plans = []
+    for city_en, level, idx, record in queries:
+        plans.append(run_plan(args, city_en, level, idx, record))
+        p = plans[-1]
+        print(f"[{city_en}/{level}] PLAN {idx}: {p['status']}, steps={p['steps']}, calls={p['calls']}, "
+              f"time={p['wall_time']:.3f}s")
+
+    report = {
+        "args": vars(args),
+        "env": {"commit": git_commit(), "python": py_platform.python_version()},
+        "summary": summarize(plans),
+        "by_city": {city_en: summarize([p for p in plans if p["city"] == city_en]) for city_en in args.cities},
+        "by_level": {level: summarize([p for p in plans if p["level"] == level]) for level in DIFFICULTY_CONFIG},
+        "plans": plans,
+    }
+    summary = report["summary"]
+    if summary:
+        print(f"\nplans={summary['plans']}, finished={summary['finished']}, steps/plan={summary['steps_per_plan']:.1f}, "
+              f"calls/plan={summary['calls_per_plan']:.1f}, prompt_tokens/plan={summary['prompt_tokens_per_plan']:.0f}")
+        print(f"latency p50={summary['latency_p50']:.3f}s p95={summary['latency_p95']:.3f}s p99={summary['latency_p99']:.3f}s")
+        print("phase share: " + ", ".join(f"{k}={v:.1%}" for k, v in summary['phase_share'].items()))
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
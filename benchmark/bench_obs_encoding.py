@@ -0,0 +1,80 @@
+"""统计真实城市缓存上各观测编码的 prompt token 数，并可对比两种编码下生成计划的 trip_eval 通过率。
+
+    python benchmark/bench_obs_encoding.py --tokenizer=Qwen/Qwen2.5-7B-Instruct
+    python benchmark/bench_obs_encoding.py --city_en=beijing \
+        --plans repr=output/beijing/m-repr/generated_plans.json table=output/beijing/m-table/generated_plans.json
+"""
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'travel_bench'))
+
+import argparse
+import json
+import pandas as pd
+
+from config import CITY_MAP
+from context import count_tokens
+from tools import search_attraction_cache, search_nearby_restaurant_cache, search_nearby_hotel_cache
+from tools import set_observation_encoding, OBSERVATION_ENCODINGS
+from poi_store import get_poi_store
+
+
+def get_counter(tokenizer):
+    if not tokenizer:
+        return count_tokens
+    from transformers import AutoTokenizer
+    tok = AutoTokenizer.from_pretrained(tokenizer)
+    return lambda text: len(tok.encode(text, add_special_tokens=False))
+
+
+def observations(city_en, max_attractions):
+    city_zh = CITY_MAP[city_en]
+    yield 'AttractionSearch', search_attraction_cache({'city_name': city_zh})
+    for record in get_poi_store(city_en).attractions()[:max_attractions]:
+        params = {'city_name': city_zh, 'attraction': record['name']}
+        yield 'NearbyRestaurantSearch', search_nearby_restaurant_cache(params)
+        yield 'NearbyHotelSearch', search_nearby_hotel_cache(params)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='all', choices=list(CITY_MAP) + ['all'])
+    parser.add_argument('--tokenizer', type=str, default=None, help='HuggingFace tokenizer 名称或路径，缺省时用 tiktoken/估计值')
+    parser.add_argument('--max_attractions', type=int, default=100)
+    parser.add_argument('--plans', type=str, nargs='*', default=[], help='encoding=generated_plans.json，对比 trip_eval 通过率')
+    args = parser.parse_args()
+    if args.plans and args.city_en == 'all':
+        parser.error('--plans 需要指定 --city_en')
+
+    counter = get_counter(args.tokenizer)
+    cities = list(CITY_MAP) if args.city_en == 'all' else [args.city_en]
+    report = {}
+    for city_en in cities:
+        if not os.path.exists(f'database/{city_en}/amap'):
+            continue
+        totals = {}
+        for encoding in OBSERVATION_ENCODINGS:
+            set_observation_encoding(encoding)
+            for tool, text in observations(city_en, args.max_attractions):
+                totals.setdefault(tool, {}).setdefault(encoding, 0)
+                totals[tool][encoding] += counter(text)
+        report[city_en] = totals
+        for tool, counts in totals.items():
+            saving = 1 - counts['table'] / counts['repr'] if counts['repr'] else 0.
+            print(f"{city_en:<10}{tool:<24}repr={counts['repr']:>9}  table={counts['table']:>9}  saving={saving:.1%}")
+
+    if args.plans:
+        import trip_eval
+        trip_eval.DATABASE_DIR = 'database'
+        query_list = pd.read_csv(f'database/{args.city_en}/travel_queries.csv').to_dict(orient='records')
+        report['pass_rates'] = {}
+        for item in args.plans:
+            encoding, path = item.split('=', 1)
+            with open(path, 'r', encoding='utf-8') as f:
+                generated_plans = json.load(f)
+            print(f"\n===== {encoding}: {path} =====")
+            report['pass_rates'][encoding] = trip_eval.evaluation(query_list, trip_eval.to_pending_plans(generated_plans), args.city_en)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
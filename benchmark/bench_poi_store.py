@@ -0,0 +1,83 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from config import CITY_MAP
+from poi_store import CityPOIStore
+
+
+def legacy_attraction_search(city_en, base_dir):
+    df = pd.read_csv(f'{base_dir}/{city_en}/amap/attraction_cache.csv', index_col=None)
+    df['cost'] = df['cost'].astype(float)
+    df = df.fillna(0)
+    df = df[['name', 'cost']]
+    df = df.to_dict(orient='records')
+    return "工具返回的景点信息是：" + str(df)
+
+
+def legacy_nearby_search(city_en, base_dir, table, attraction):
+    df = pd.read_csv(f'{base_dir}/{city_en}/amap/{table}_cache.csv', index_col=None)
+    df = df[df['attraction'] == attraction]
+    df['cost'] = df['cost'].astype(float)
+    df = df.fillna('N/A')
+    df = df[['name', 'cost', 'keytag']]
+    df = df.iloc[:30]
+    df = df.to_dict(orient='records')
+    return str(df)
+
+
+def store_attraction_search(store):
+    return "工具返回的景点信息是：" + str(store.attractions())
+
+
+def store_nearby_search(store, table, attraction):
+    if table == 'restaurant':
+        return str(store.nearby_restaurants(attraction)[:30])
+    return str(store.nearby_hotels(attraction)[:30])
+
+
+def timeit(func, repeat):
+    costs = []
+    for _ in range(repeat):
+        t1 = time.perf_counter()
+        func()
+        costs.append(time.perf_counter() - t1)
+    return np.array(costs) * 1000
+
+
+def report(name, costs):
+    print(f"{name:<28} mean={costs.mean():9.3f}ms  p50={np.percentile(costs, 50):9.3f}ms  "
+          f"p95={np.percentile(costs, 95):9.3f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='beijing', choices=list(CITY_MAP))
+    parser.add_argument('--base_dir', type=str, default='database')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    city_en, base_dir = args.city_en, args.base_dir
+    attraction = pd.read_csv(f'{base_dir}/{city_en}/amap/attraction_cache.csv')['name'].iloc[0]
+
+    store = CityPOIStore(city_en, base_dir)
+    t1 = time.perf_counter()
+    store.attractions(), store.nearby_restaurants(attraction), store.nearby_hotels(attraction)
+    print(f"CityPOIStore cold load: {(time.perf_counter() - t1) * 1000:.1f}ms")
+
+    assert legacy_attraction_search(city_en, base_dir) == store_attraction_search(store)
+    for table in ['restaurant', 'hotel']:
+        assert legacy_nearby_search(city_en, base_dir, table, attraction) == store_nearby_search(store, table, attraction)
+
+    report("AttractionSearch (csv)", timeit(lambda: legacy_attraction_search(city_en, base_dir), args.repeat))
+    report("AttractionSearch (store)", timeit(lambda: store_attraction_search(store), args.repeat))
+    for table in ['restaurant', 'hotel']:
+        report(f"Nearby {table} (csv)",
+               timeit(lambda: legacy_nearby_search(city_en, base_dir, table, attraction), args.repeat))
+        report(f"Nearby {table} (store)",
+               timeit(lambda: store_nearby_search(store, table, attraction), args.repeat))
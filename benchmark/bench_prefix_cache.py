@@ -0,0 +1,130 @@
+"""对比各上下文策略在本地 vLLM 上的前缀缓存命中率和首 token 时延(TTFT)。
+
+vLLM 需开启前缀缓存与 token 明细，例如：
+    vllm serve ... --enable-prefix-caching --enable-prompt-tokens-details
+直接度量 agent 的真实请求（不另发探测请求，以免探测预热缓存、抬高命中率）：以流式方式发送，
+收到第一个内容或工具调用片段的耗时即 TTFT（排队 + prefill），末尾 usage 中的
+prompt_tokens_details.cached_tokens 即服务端命中的前缀长度。同时在客户端计算
+本次请求与此前任一请求的最长公共前缀占比，作为与服务端无关的理想命中率。
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from llm_api import build_params
+from travel_agent import ReActTravelAgent
+from context import CONTEXT_STRATEGIES
+from tools import set_transport_mode, TRANSPORT_MODES
+
+
+class MeasuredLLM:
+    def __init__(self, llm, strategy, plan_idx, records):
+        self.llm = llm
+        self.model_name = llm.model_name
+        self.usage = llm.usage
+        self.strategy = strategy
+        self.plan_idx = plan_idx
+        self.records = records
+        self.history = []
+        self.last_usage = None
+
+    def shared_prefix_ratio(self, serialized):
+        shared = max((len(os.path.commonprefix([serialized, prev])) for prev in self.history), default=0)
+        self.history.append(serialized)
+        return shared / max(len(serialized), 1)
+
+    def get_response(self, messages, tools, max_tokens=1024, temperature=0., **kwargs):
+        params = build_params(self.llm.model_name, messages, tools, max_tokens, temperature, False)
+        client_prefix_ratio = self.shared_prefix_ratio(json.dumps([messages, tools], ensure_ascii=False))
+        t1 = time.perf_counter()
+        ttft, usage = None, None
+        content, tool_name, tool_args = [], None, []
+        for chunk in self.llm.client.chat.completions.create(**params, stream=True,
+                                                              stream_options={"include_usage": True}):
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if ttft is None and (delta.content or delta.tool_calls):
+                ttft = time.perf_counter() - t1
+            if delta.content:
+                content.append(delta.content)
+            for call in delta.tool_calls or []:
+                if call.index != 0 or not call.function:  # 与 parse_completion 一致，只取第一个工具调用
+                    continue
+                tool_name = tool_name or call.function.name
+                tool_args.append(call.function.arguments or "")
+
+        self.usage["calls"] += 1
+        prompt_tokens = usage.prompt_tokens if usage else None
+        details = getattr(usage, 'prompt_tokens_details', None) if usage else None
+        cached_tokens = getattr(details, 'cached_tokens', None) if details else None
+        self.last_usage = {"prompt_tokens": prompt_tokens or 0, "completion_tokens": usage.completion_tokens if usage else 0}
+        self.usage["prompt_tokens"] += self.last_usage["prompt_tokens"]
+        self.usage["completion_tokens"] += self.last_usage["completion_tokens"]
+        self.records.append({
+            "strategy": self.strategy,
+            "plan": self.plan_idx,
+            "request": len(self.history) - 1,
+            "ttft": ttft if ttft is not None else time.perf_counter() - t1,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "server_cached_ratio": cached_tokens / prompt_tokens if cached_tokens is not None and prompt_tokens else None,
+            "client_prefix_ratio": client_prefix_ratio,
+        })
+
+        content = "".join(content).strip()
+        if tool_name:
+            return {"type": "tool_call", "tool_name": tool_name, "tool_args": "".join(tool_args), "content": content}
+        return {"type": "message", "content": content}
+
+
+def summarize(records):
+    summary = {}
+    for strategy in dict.fromkeys(r["strategy"] for r in records):
+        rs = [r for r in records if r["strategy"] == strategy]
+        server = [r["server_cached_ratio"] for r in rs if r["server_cached_ratio"] is not None]
+        summary[strategy] = {
+            "requests": len(rs),
+            "ttft_mean": float(np.mean([r["ttft"] for r in rs])),
+            "ttft_p95": float(np.percentile([r["ttft"] for r in rs], 95)),
+            "prompt_tokens_mean": float(np.mean([r["prompt_tokens"] or 0 for r in rs])),
+            "client_prefix_ratio": float(np.mean([r["client_prefix_ratio"] for r in rs])),
+            "server_cached_ratio": float(np.mean(server)) if server else None,
+        }
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='beijing')
+    parser.add_argument('--platform', type=str, default='vLLM')
+    parser.add_argument('--model_name', type=str, default='citygpt-t-beijing')
+    parser.add_argument('--num_queries', type=int, default=5)
+    parser.add_argument('--strategies', type=str, nargs='+', default=list(CONTEXT_STRATEGIES))
+    parser.add_argument('--transport_mode', type=str, default='offline', choices=TRANSPORT_MODES)
+    parser.add_argument('--output', type=str, default='output/bench_prefix_cache.jsonl')
+    args = parser.parse_args()
+    set_transport_mode(args.transport_mode)
+
+    query_df = pd.read_csv(f'database/{args.city_en}/travel_queries.csv').iloc[:args.num_queries]
+    records = []
+    for strategy in args.strategies:
+        for idx, query in zip(query_df.index, query_df['query']):
+            agent = ReActTravelAgent(args.platform, args.model_name, context_strategy=strategy)
+            agent.llm = MeasuredLLM(agent.llm, strategy, int(idx), records)
+            agent.plan_trip(query)
+            print(f"[{strategy}] PLAN {idx}: steps={agent.step_n - 1}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(json.dumps(summarize(records), ensure_ascii=False, indent=2))
@@ -0,0 +1,65 @@
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'travel_bench'))
+
+import argparse
+import json
+import time
+import pandas as pd
+
+from travel_agent import ReActTravelAgent, STEP_MODES
+from tools import set_transport_mode, TRANSPORT_MODES
+import trip_eval
+
+
+def run_mode(step_mode, platform, model_name, queries):
+    plans, stats = {}, {"plans": 0, "steps": 0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "wall_time": 0.}
+    for idx, query in queries:
+        agent = ReActTravelAgent(platform, model_name, step_mode=step_mode)
+        t1 = time.time()
+        plans[idx] = agent.plan_trip(query) or ""
+        stats["wall_time"] += time.time() - t1
+        stats["plans"] += 1
+        stats["steps"] += agent.step_n - 1
+        for k in ["calls", "prompt_tokens", "completion_tokens"]:
+            stats[k] += agent.llm.usage[k]
+        print(f"[{step_mode}] PLAN {idx}: steps={agent.step_n - 1}, calls={agent.llm.usage['calls']}")
+    return plans, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='beijing')
+    parser.add_argument('--platform', type=str, default='vLLM')
+    parser.add_argument('--model_name', type=str, default='citygpt-t-beijing')
+    parser.add_argument('--num_queries', type=int, default=10)
+    parser.add_argument('--transport_mode', type=str, default='offline', choices=TRANSPORT_MODES)
+    parser.add_argument('--output', type=str, default='output/bench_step_mode.json')
+    args = parser.parse_args()
+    set_transport_mode(args.transport_mode)
+    trip_eval.DATABASE_DIR = 'database'
+
+    query_df = pd.read_csv(f'database/{args.city_en}/travel_queries.csv', index_col=None, header=0).iloc[:args.num_queries]
+    queries = list(zip(query_df.index, query_df['query']))
+    query_records = query_df.to_dict(orient='records')
+
+    report = {}
+    for step_mode in STEP_MODES:
+        plans, stats = run_mode(step_mode, args.platform, args.model_name, queries)
+        n = max(stats["plans"], 1)
+        stats.update({f"{k}_per_plan": stats[k] / n for k in ["steps", "calls", "prompt_tokens", "completion_tokens", "wall_time"]})
+        print(f"\n===== step_mode={step_mode} =====")
+        stats["eval"] = trip_eval.evaluation(query_records, trip_eval.to_pending_plans(plans), args.city_en)
+        report[step_mode] = stats
+
+    print(f"\n{'metric':<28}" + "".join(f"{m:>16}" for m in STEP_MODES))
+    for k in ["calls_per_plan", "prompt_tokens_per_plan", "completion_tokens_per_plan", "wall_time_per_plan", "steps_per_plan"]:
+        print(f"{k:<28}" + "".join(f"{report[m][k]:>16.1f}" for m in STEP_MODES))
+    for k in ["delivery_rate", "final_pass_rate"]:
+        print(f"{k:<28}" + "".join(f"{report[m]['eval'][k]:>16.2%}" for m in STEP_MODES))
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"args": vars(args), "report": report}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,188 @@
+"""本地 OpenAI 兼容的录制/回放服务，用于在无网络、无 GPU 的机器上对 agent 和评测脚本做可复现的压测。
+
+录制：把请求转发到真实服务并保存到会话文件
+    python benchmark/llm_replay_server.py record --upstream=http://localhost:23199/v1 --session=sessions/beijing.jsonl
+回放：按请求内容匹配录制结果，可注入时延分布
+    python benchmark/llm_replay_server.py replay --session=sessions/beijing.jsonl --latency=lognormal:-1.0,0.5
+客户端通过环境变量把平台指向本服务，例如：
+    vLLM_BASE_URL=http://localhost:23200/v1 python run_agent.py --platform=vLLM --model_name=citygpt-t-beijing
+
+支持 /v1/chat/completions（含 tools/tool_calls、response_format，不支持 stream）和 /v1/models。
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from kv_store import hash_key
+
+KEY_FIELDS = ['model', 'messages', 'tools', 'tool_choice', 'max_tokens', 'temperature', 'response_format']
+
+
+def request_key(body):
+    return hash_key({k: body.get(k) for k in KEY_FIELDS})
+
+
+class LatencySampler:
+    """none | constant:s | uniform:lo,hi | lognormal:mu,sigma | normal:mean,std（秒）"""
+
+    def __init__(self, spec, seed=0):
+        self.kind, _, args = spec.partition(':')
+        self.args = [float(x) for x in args.split(',')] if args else []
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.kind == 'constant':
+                return self.args[0]
+            if self.kind == 'uniform':
+                return self.rng.uniform(*self.args)
+            if self.kind == 'lognormal':
+                return self.rng.lognormvariate(*self.args)
+            if self.kind == 'normal':
+                return max(0., self.rng.gauss(*self.args))
+            return 0.
+
+
+class Session:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_key = {}
+        self.ordered = []
+        self.cursors = {}
+        self.sequence_cursor = 0
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.by_key.setdefault(record['key'], []).append(record['response'])
+                        self.ordered.append(record['response'])
+
+    def record(self, key, request, response):
+        with self.lock:
+            self.by_key.setdefault(key, []).append(response)
+            self.ordered.append(response)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'request': request, 'response': response}, ensure_ascii=False) + '\n')
+
+    def lookup(self, key, on_miss):
+        with self.lock:
+            responses = self.by_key.get(key)
+            if responses:
+                # 同一请求录制了多次时依次轮流返回
+                cursor = self.cursors.get(key, 0)
+                self.cursors[key] = cursor + 1
+                self.hits += 1
+                return responses[cursor % len(responses)]
+            self.misses += 1
+            if on_miss == 'sequence' and self.ordered:
+                response = self.ordered[self.sequence_cursor % len(self.ordered)]
+                self.sequence_cursor += 1
+                return response
+            return None
+
+
+def make_handler(args, session, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def send_json(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, status, message):
+            self.send_json(status, {'error': {'message': message, 'type': 'replay_error', 'code': status}})
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                models = sorted({r.get('model', 'replay') for rs in session.by_key.values() for r in rs}) or ['replay']
+                self.send_json(200, {'object': 'list', 'data': [{'id': m, 'object': 'model', 'owned_by': 'replay'} for m in models]})
+            elif self.path.rstrip('/').endswith('/stats'):
+                self.send_json(200, {'hits': session.hits, 'misses': session.misses, 'recorded': len(session.ordered)})
+            else:
+                self.send_error_json(404, f'unknown path {self.path}')
+
+        def do_POST(self):
+            # 先读完请求体再回复，否则残留的请求体会破坏 keep-alive 连接上的下一个请求
+            raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self.send_error_json(404, f'unknown path {self.path}')
+            try:
+                body = json.loads(raw or b'{}')
+            except json.JSONDecodeError as e:
+                return self.send_error_json(400, f'invalid JSON body: {e}')
+            if body.get('stream'):
+                return self.send_error_json(400, 'stream is not supported by the replay server')
+            key = request_key(body)
+
+            if args.mode == 'record':
+                headers = {'Authorization': self.headers.get('Authorization', ''), 'Content-Type': 'application/json'}
+                try:
+                    upstream = requests.post(f"{args.upstream.rstrip('/')}/chat/completions", json=body,
+                                             headers=headers, timeout=args.upstream_timeout)
+                    if upstream.status_code != 200:
+                        return self.send_error_json(upstream.status_code, upstream.text)
+                    response = upstream.json()
+                except (requests.RequestException, ValueError) as e:
+                    return self.send_error_json(502, f'upstream error: {e}')
+                session.record(key, body, response)
+                return self.send_json(200, response)
+
+            response = session.lookup(key, args.on_miss)
+            if response is None:
+                return self.send_error_json(404, f'no recorded response for request {key}')
+            delay = latency.sample()
+            if delay > 0:
+                time.sleep(delay)
+            self.send_json(200, response)
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--session', type=str, required=True, help='会话文件（JSONL），录制时追加写入')
+    parser.add_argument('--upstream', type=str, default='http://localhost:23199/v1')
+    parser.add_argument('--upstream_timeout', type=float, default=600)
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=23200)
+    parser.add_argument('--latency', type=str, default='none', help=LatencySampler.__doc__)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--on_miss', type=str, default='error', choices=['error', 'sequence'],
+                        help='回放未命中时：error 返回 404；sequence 按录制顺序依次返回')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if os.path.dirname(args.session):
+        os.makedirs(os.path.dirname(args.session), exist_ok=True)
+    session = Session(args.session)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, session, LatencySampler(args.latency, args.seed)))
+    print(f"{args.mode} server on http://{args.host}:{args.port}/v1, {len(session.ordered)} recorded responses")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"hits={session.hits}, misses={session.misses}")
@@ -13,6 +13,14 @@ ATTEMPT_COUNTER = 10
 
 ROOT_PATH = '/usr/exp/CityGPT-Travel'  # replace it with your experimental path
 
+TRANSPORT_CACHE_BACKEND = 'sqlite'  # 'sqlite': 单文件 WAL 缓存; 'json': 旧版一查询一文件
+TRANSPORT_CACHE_TTL = None  # 秒，None 表示永不过期
+TRANSPORT_CACHE_MAX_ENTRIES = None  # 超出后按最近访问时间淘汰
+BAIDU_TIMEOUT = (3.05, 10)  # (连接超时, 读取超时)，秒
+BAIDU_POOL_MAXSIZE = 16  # 百度接口每个 host 的最大并发连接数
+OBSERVATION_ENCODING = 'repr'  # 'repr': dict 列表; 'table': 表头只出现一次的 TSV，更省 token
+TRANSPORT_MODE = 'live'  # 'live': 缓存未命中时调用百度接口; 'cache-only': 只读缓存; 'offline': 由坐标离线估计
+
 CITY_MAP = {'beijing': '北京市', 'shanghai': '上海市', 'guangzhou':'广州市', 'chengdu':'成都市', 'xian':'西安市'}
 
 CUISINE_MAP = {
@@ -0,0 +1,214 @@
+"""ReAct 循环的上下文策略：决定每次调用 LLM 时发送哪些历史消息。
+
+- prune：原始策略，每步开始时删除控制提示和较早的 Observation（会改写历史，前缀缓存几乎无法命中）。
+- append_only：历史只追加不改写，控制提示只附在请求末尾；较早的 Observation 按固定大小的块整体压缩，
+  压缩边界每 block_size 个 Observation 才移动一次，因此相邻请求可以复用尽可能长的缓存前缀。
+- token_budget：增量记录每条消息的 token 数，每次调用前按预算先摘要、再移除最早的 Observation，仍超预算时
+  再成组移除最早的 Thought/Action，最后截断保留的最新 Observation（例如一次返回整张景点表的 AttractionSearch）；
+  始终保留系统提示、用户查询、最新的 Observation（可能被截断）和当前笔记本状态。
+  每次的裁剪决策记录在 decisions 中，开启追踪时也附在 context span 上。
+"""
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+_CJK = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    return int(cjk * 0.7 + (len(text) - cjk) / 4) + 1
+
+
+def is_observation(msg):
+    return msg['role'] == 'assistant' and isinstance(msg['content'], str) and msg['content'].startswith('Observation')
+
+
+def compact_observation(content, max_chars):
+    if len(content) <= max_chars:
+        return content
+    return content[:max_chars] + f"...(已省略{len(content) - max_chars}字)"
+
+
+class PruneContext:
+    name = 'prune'
+
+    def __init__(self, keep_last_observations=2):
+        self.keep_last_observations = keep_last_observations
+        self.decisions = []
+
+    def reset(self):
+        pass
+
+    def before_step(self, agent):
+        agent._prune_messages(keep_last_observations=self.keep_last_observations)
+
+    def build(self, messages, control):
+        messages.append(control)
+        return messages
+
+
+class AppendOnlyContext:
+    name = 'append_only'
+
+    def __init__(self, block_size=4, keep_recent=2, compact_chars=120):
+        self.block_size = block_size
+        self.keep_recent = keep_recent
+        self.compact_chars = compact_chars
+        self.decisions = []
+
+    def reset(self):
+        pass
+
+    def before_step(self, agent):
+        pass
+
+    def build(self, messages, control):
+        obs_indices = [idx for idx, msg in enumerate(messages) if is_observation(msg)]
+        n_compact = max(0, len(obs_indices) - self.keep_recent) // self.block_size * self.block_size
+        compact_indices = set(obs_indices[:n_compact])
+        view = [{"role": msg['role'], "content": compact_observation(msg['content'], self.compact_chars)}
+                if idx in compact_indices else msg
+                for idx, msg in enumerate(messages)]
+        return view + [control]
+
+
+class TokenBudgetContext:
+    name = 'token_budget'
+
+    def __init__(self, budget=6000, summary_chars=80, keep_recent=1):
+        self.budget = budget
+        self.summary_chars = summary_chars
+        self.keep_recent = keep_recent
+        self.reset()
+
+    def reset(self):
+        self._tokens = []
+        self._summary_tokens = {}
+        self.notebook = None
+        self.step_n = 0
+        self.decisions = []
+
+    def before_step(self, agent):
+        self.notebook = agent.notebook
+        self.step_n = agent.step_n
+
+    def _count(self, messages):
+        for msg in messages[len(self._tokens):]:
+            self._tokens.append(count_tokens(msg['content']))
+
+    def _notebook_message(self):
+        if not self.notebook or not self.notebook.data:
+            return None
+        return {"role": "user", "content": f"当前笔记本状态：{self.notebook.data}"}
+
+    @staticmethod
+    def _thought_action_groups(messages, obs_indices, n_candidates):
+        """Observation 都已移除仍超预算时，按从早到晚的顺序成组移除各步的 Thought/Action；
+        最早一条保留的 Observation 所在的步及之后的消息不动（没有保留的 Observation 时只保留最后一条消息）。"""
+        kept_obs = n_candidates < len(obs_indices)
+        protected_from = obs_indices[n_candidates] if kept_obs else len(messages) - 1
+        groups, group = [], []
+        for idx, msg in enumerate(messages[:protected_from]):
+            if is_observation(msg):
+                if group:
+                    groups.append(group)
+                group = []
+            elif msg['role'] == 'assistant':
+                group.append(idx)
+        if group and not kept_obs:
+            groups.append(group)
+        return groups
+
+    def _truncate(self, content, tokens, target):
+        """把 content 截到不超过 target 个 token，至少保留 summary_chars 个字符，返回 (截断后的内容, token 数)。"""
+        max_chars = len(content) * max(target, 0) // max(tokens, 1)
+        while True:
+            max_chars = max(max_chars, self.summary_chars)
+            cut = compact_observation(content, max_chars)
+            cut_tokens = count_tokens(cut)
+            if cut_tokens <= target or max_chars == self.summary_chars:
+                return cut, cut_tokens
+            max_chars = max_chars * target // cut_tokens
+
+    def build(self, messages, control):
+        self._count(messages)
+        pinned = [msg for msg in [self._notebook_message(), control] if msg]
+        pinned_tokens = sum(count_tokens(msg['content']) for msg in pinned)
+        total = sum(self._tokens) + pinned_tokens
+        tokens_before = total
+
+        obs_indices = [idx for idx, msg in enumerate(messages) if is_observation(msg)]
+        candidates = obs_indices[:-self.keep_recent] if self.keep_recent else obs_indices
+        summarized, dropped = {}, set()
+        for idx in candidates:
+            if total <= self.budget:
+                break
+            content = compact_observation(messages[idx]['content'], self.summary_chars)
+            if idx not in self._summary_tokens:
+                self._summary_tokens[idx] = count_tokens(content)
+            if self._summary_tokens[idx] < self._tokens[idx]:
+                summarized[idx] = content
+                total -= self._tokens[idx] - self._summary_tokens[idx]
+        for idx in candidates:
+            if total <= self.budget:
+                break
+            dropped.add(idx)
+            total -= self._summary_tokens[idx] if idx in summarized else self._tokens[idx]
+            summarized.pop(idx, None)
+        evicted = set()
+        for group in self._thought_action_groups(messages, obs_indices, len(candidates)):
+            if total <= self.budget:
+                break
+            evicted.update(group)
+            total -= sum(self._tokens[idx] for idx in group)
+        truncated = {}
+        for idx in obs_indices[len(candidates):]:  # 其余都已移除仍超预算时，截断保留的 Observation
+            if total <= self.budget:
+                break
+            content, tokens = self._truncate(messages[idx]['content'], self._tokens[idx],
+                                             self._tokens[idx] - (total - self.budget))
+            if tokens < self._tokens[idx]:
+                truncated[idx] = content
+                total -= self._tokens[idx] - tokens
+
+        view = []
+        for idx, msg in enumerate(messages):
+            if idx in dropped or idx in evicted:
+                continue
+            content = summarized.get(idx, truncated.get(idx))
+            view.append({"role": msg['role'], "content": content} if content is not None else msg)
+        self.decisions.append({
+            "step": self.step_n,
+            "messages": len(messages),
+            "tokens_before": tokens_before,
+            "tokens_after": total,
+            "summarized": sorted(summarized),
+            "dropped": sorted(dropped),
+            "evicted": sorted(evicted),
+            "truncated": sorted(truncated),
+            "kept": len(view) + len(pinned),
+            "over_budget": total > self.budget,
+        })
+        return view + pinned
+
+
+CONTEXT_STRATEGIES = {
+    'prune': PruneContext,
+    'append_only': AppendOnlyContext,
+    'token_budget': TokenBudgetContext,
+}
+
+
+def make_context(name, **kwargs):
+    if name not in CONTEXT_STRATEGIES:
+        raise ValueError(f"context strategy must be one of {list(CONTEXT_STRATEGIES)}, got {name}")
+    return CONTEXT_STRATEGIES[name](**kwargs)
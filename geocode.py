@@ -0,0 +1,61 @@
+"""预先为某城市 amap 缓存中的全部景点/餐厅/酒店名称计算百度坐标，写入持久化坐标缓存，可中断后续跑。
+
+    python geocode.py --city_en=beijing --workers=8
+"""
+from config import CITY_MAP
+from tools import get_baidu_coordinates, coordinate_cache
+from poi_store import get_poi_store
+from kv_store import hash_key
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def pending_names(city_en):
+    store = get_poi_store(city_en)
+    city_zh = CITY_MAP[city_en]
+    names = []
+    for table in ['attraction', 'restaurant', 'hotel']:
+        for name in sorted(store.names(table)):
+            if hash_key([city_zh, name]) not in coordinate_cache:
+                names.append(name)
+    return list(dict.fromkeys(names))
+
+
+def geocode_one(name, city_zh, min_interval):
+    t1 = time.time()
+    try:
+        coordinates = get_baidu_coordinates(name, city_zh)
+    except Exception as e:
+        coordinates = f"请求异常：{e}"
+    elapsed = time.time() - t1
+    if elapsed < min_interval:
+        time.sleep(min_interval - elapsed)
+    return name, coordinates
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='beijing', choices=list(CITY_MAP))
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--min_interval', type=float, default=0.1, help='每个 worker 两次请求之间的最小间隔（秒）')
+    args = parser.parse_args()
+
+    city_zh = CITY_MAP[args.city_en]
+    names = pending_names(args.city_en)
+    print(f"{args.city_en}: 待解析坐标 {len(names)} 个")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(geocode_one, name, city_zh, args.min_interval) for name in names]
+        for i, future in enumerate(as_completed(futures), 1):
+            name, coordinates = future.result()
+            if hash_key([city_zh, name]) not in coordinate_cache:
+                failed.append((name, coordinates))
+            if i % 100 == 0 or i == len(futures):
+                print(f"进度 {i}/{len(futures)}，失败 {len(failed)}")
+
+    for name, reason in failed[:20]:
+        print(f"失败：{name} -> {reason}")
+    print(coordinate_cache.stats.as_dict())
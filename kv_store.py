@@ -0,0 +1,244 @@
+"""单文件键值缓存：SQLite(WAL) 后端支持多进程并发读写、原子写入、命中统计以及 TTL/容量淘汰。
+
+导入旧版一查询一文件的 JSON 缓存目录：
+    python kv_store.py --import_json_dir=/usr/exp/CityGPT-Travel/database/transport_cache \
+                       --db=/usr/exp/CityGPT-Travel/database/transport_cache.sqlite --table=transport
+tools.py 从 transport 表读取交通缓存，--table 默认即为 transport。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def hash_key(obj):
+    raw = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def incr(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.}
+
+
+class SQLiteKVStore:
+    def __init__(self, path, table='kv', ttl=None, max_entries=None, evict_every=100):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.stats = _Stats()
+        self._unevicted_writes = 0  # 上次淘汰以来的写入数；stats.writes 会被 set_many 一次加很多，不能按它取模
+        self._unevicted_lock = threading.Lock()
+        self._local = threading.local()
+        self._conns = []  # 所有线程打开的连接，供 close() 统一关闭
+        self._conns_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ("
+                     "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table}(accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 每个连接只在创建它的线程中使用；关闭 check_same_thread 是为了让 close() 能在任意线程关闭全部连接
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        """关闭所有线程打开的连接；之后再次读写会重新建立连接。"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, key, default=None):
+        conn = self._conn()
+        row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+            if row is not None:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.stats.incr('evictions')
+            self.stats.incr('misses')
+            return default
+        if self.max_entries is not None:
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats.incr('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        self._conn().execute(f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(value, ensure_ascii=False), now, now))
+        self.stats.incr('writes')
+        if self.max_entries is None:
+            return
+        with self._unevicted_lock:
+            self._unevicted_writes += 1
+            due = self._unevicted_writes >= self.evict_every
+            if due:
+                self._unevicted_writes = 0
+        if due:
+            self.evict()
+
+    def set_many(self, items):
+        now = time.time()
+        conn = self._conn()
+        rows = [(k, json.dumps(v, ensure_ascii=False), now, now) for k, v in items]
+        conn.execute("BEGIN")
+        conn.executemany(f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+        self.stats.incr('writes', len(rows))
+        if self.max_entries is not None:
+            self.evict()
+        return len(rows)
+
+    def evict(self):
+        with self._unevicted_lock:
+            self._unevicted_writes = 0
+        conn = self._conn()
+        evicted = 0
+        if self.ttl is not None:
+            evicted += conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        if self.max_entries is not None:
+            overflow = len(self) - self.max_entries
+            if overflow > 0:
+                evicted += conn.execute(f"DELETE FROM {self.table} WHERE key IN "
+                                        f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)", (overflow,)).rowcount
+        self.stats.incr('evictions', evicted)
+        return evicted
+
+    def __contains__(self, key):
+        return self._conn().execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class JsonDirKVStore:
+    """旧版布局：每个键一个 {key}.json 文件，写入改为临时文件 + 原子 rename。"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stats = _Stats()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.stats.incr('misses')
+            return default
+        self.stats.incr('hits')
+        return value
+
+    def set(self, key, value):
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+        self.stats.incr('writes')
+
+    def set_many(self, items):
+        n = 0
+        for key, value in items:
+            self.set(key, value)
+            n += 1
+        return n
+
+    def evict(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return sum(1 for file in os.listdir(self.cache_dir) if file.endswith('.json'))
+
+
+def open_store(backend, path, **kwargs):
+    if backend == 'sqlite':
+        return SQLiteKVStore(path, **kwargs)
+    elif backend == 'json':
+        return JsonDirKVStore(path)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def iter_json_dir(json_dir):
+    for file in os.listdir(json_dir):
+        if not file.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(json_dir, file), "r", encoding="utf-8") as f:
+                yield file[:-len('.json')], json.load(f)
+        except json.JSONDecodeError:
+            print(f"跳过损坏的缓存文件：{file}")
+
+
+def import_json_dir(store, json_dir, batch_size=1000):
+    batch, total = [], 0
+    for item in iter_json_dir(json_dir):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            total += store.set_many(batch)
+            batch = []
+    if batch:
+        total += store.set_many(batch)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--import_json_dir', type=str, required=True)
+    parser.add_argument('--db', type=str, required=True)
+    parser.add_argument('--table', type=str, default='transport', help='tools.py 读取的交通缓存表为 transport')
+    args = parser.parse_args()
+
+    with SQLiteKVStore(args.db, table=args.table) as store:
+        n = import_json_dir(store, args.import_json_dir)
+        print(f"导入 {n} 条缓存，当前共 {len(store)} 条：{args.db}")
@@ -1,8 +1,10 @@
 from dotenv import load_dotenv
-from config import WAIT_TIME_MIN, WAIT_TIME_MAX, ATTEMPT_COUNTER, PROXY, MODEL_DICT
+from config import WAIT_TIME_MIN, WAIT_TIME_MAX, ATTEMPT_COUNTER, PROXY, MODEL_DICT, ROOT_PATH
+from kv_store import SQLiteKVStore, hash_key
 
+import asyncio
 import httpx
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
 from tenacity import (
     retry,
@@ -11,65 +13,214 @@ from tenacity import (
 )
 load_dotenv()
 
+PLATFORM_CONFIG = {
+    'OpenAI': {'base_url': 'https://api.openai.com/v1', 'use_proxy': True},
+    'SiliconFlow': {'base_url': 'https://api.siliconflow.cn/v1', 'use_proxy': False},
+    'DeepInfra': {'base_url': 'https://api.deepinfra.com/v1/openai', 'use_proxy': True},
+    'vLLM': {'base_url': 'http://localhost:23199/v1', 'use_proxy': False},
+}
+
+
+class ResponseCache:
+    """按 (平台, 实际模型, messages, tools, max_tokens, temperature, response_format) 的哈希缓存解析后的回复，
+    超出 max_entries 后按最近访问时间淘汰；默认只缓存 temperature=0 的确定性请求。
+    调用方可给 get_response 传 cache_if，只缓存通过其检查的回复，以免重试和重跑时反复取回同一个不合格的回复。"""
+
+    def __init__(self, path=f'{ROOT_PATH}/database/llm_cache.sqlite', max_entries=200000, cache_sampling=False):
+        self.store = SQLiteKVStore(path, table='llm_response', max_entries=max_entries)
+        self.cache_sampling = cache_sampling
+
+    def key(self, platform, params):
+        if params.get("temperature") and not self.cache_sampling:
+            return None
+        return hash_key([platform, params])
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def stats(self):
+        return self.store.stats.as_dict()
+
 
 def get_api_key(platform):
     return os.environ[f'{platform}_API_KEY']
 
 
+def get_base_url(platform):
+    # 可通过环境变量 {platform}_BASE_URL 指向其他兼容服务，例如本地的录制/回放服务
+    return os.environ.get(f'{platform}_BASE_URL', PLATFORM_CONFIG[platform]['base_url'])
+
+
+def use_proxy(platform):
+    return PLATFORM_CONFIG[platform]['use_proxy'] and f'{platform}_BASE_URL' not in os.environ
+
+
+def build_params(model_name, messages, tools, max_tokens, temperature, get_json, top_logprobs=None):
+    params = {
+        "model": model_name,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if tools:
+        params["tools"] = tools
+        params["tool_choice"] = "auto"
+    if get_json:
+        params["response_format"] = {"type": "json_object"}
+    if top_logprobs:
+        params["logprobs"] = True
+        params["top_logprobs"] = top_logprobs
+    return params
+
+
+def record_usage(usage, completion):
+    """累加到 usage，并返回本次调用的 token 数。"""
+    usage["calls"] += 1
+    call_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    if getattr(completion, "usage", None):
+        call_usage["prompt_tokens"] = completion.usage.prompt_tokens or 0
+        call_usage["completion_tokens"] = completion.usage.completion_tokens or 0
+        usage["prompt_tokens"] += call_usage["prompt_tokens"]
+        usage["completion_tokens"] += call_usage["completion_tokens"]
+    return call_usage
+
+
+def parse_top_logprobs(choice):
+    """第一个生成 token 位置上的候选 token -> logprob。"""
+    content = getattr(choice.logprobs, "content", None) if getattr(choice, "logprobs", None) else None
+    if not content:
+        return {}
+    return {item.token: item.logprob for item in content[0].top_logprobs}
+
+
+def parse_completion(completion, get_json, top_logprobs=None):
+    msg = completion.choices[0].message
+    # Case 1: 模型触发了工具调用
+    if hasattr(msg, "tool_calls") and msg.tool_calls:
+        return {
+            "type": "tool_call",
+            "tool_name": msg.tool_calls[0].function.name,
+            "tool_args": msg.tool_calls[0].function.arguments,
+            "content": msg.content.strip() if msg.content else ""
+        }
+
+    if get_json:
+        return msg.content.strip()
+    result = {
+        "type": "message",
+        "content": msg.content.strip() if msg.content else ""
+    }
+    if top_logprobs:
+        result["top_logprobs"] = parse_top_logprobs(completion.choices[0])
+    return result
+
+
 class LLMCaller:
-    def __init__(self, platform, model_name):
-        if platform == "OpenAI":
-            self.client = OpenAI(
-                api_key=get_api_key('OpenAI'),
-                base_url='https://api.openai.com/v1',
-                http_client=httpx.Client(proxy=PROXY),
-            )
-        elif platform == "SiliconFlow":
-            self.client = OpenAI(
-                base_url="https://api.siliconflow.cn/v1",
-                api_key=get_api_key(platform)
-            )
-        elif platform == "DeepInfra":
-            self.client = OpenAI(
-                api_key=get_api_key(platform),
-                http_client=httpx.Client(proxy=PROXY),
-                base_url="https://api.deepinfra.com/v1/openai",
-            )
-        elif platform == 'vLLM':
-            self.client = OpenAI(
-                base_url="http://localhost:23199/v1",
-                api_key=get_api_key(platform),
-            )
+    def __init__(self, platform, model_name, cache=None):
+        if platform not in PLATFORM_CONFIG:
+            raise ValueError(f"platform must be one of {list(PLATFORM_CONFIG)}, got {platform}")
+        self.platform = platform
+        self.cache = cache
+        self.client = OpenAI(
+            api_key=get_api_key(platform),
+            base_url=get_base_url(platform),
+            http_client=httpx.Client(proxy=PROXY) if use_proxy(platform) else None,
+        )
         self.model_name = MODEL_DICT.get(model_name).get(platform)
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cache_hits": 0}
+        self.last_usage = None  # 最近一次调用的 token 数，供追踪记录
 
     @retry(wait=wait_random_exponential(min=WAIT_TIME_MIN, max=WAIT_TIME_MAX), stop=stop_after_attempt(ATTEMPT_COUNTER))
-    def get_response(self, messages, tools, max_tokens=1024, temperature=0., get_json=False):
-        params = {
-            "model": self.model_name,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        if tools:
-            params["tools"] = tools
-            params["tool_choice"] = "auto"
-        if get_json:
-            params["response_format"] = {"type": "json_object"}
-
+    def get_response(self, messages, tools, max_tokens=1024, temperature=0., get_json=False, top_logprobs=None,
+                     cache_if=None):
+        params = build_params(self.model_name, messages, tools, max_tokens, temperature, get_json, top_logprobs)
+        cache_key = self.cache.key(self.platform, params) if self.cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.usage["cache_hits"] += 1
+                self.last_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cache_hit": True}
+                return cached
         completion = self.client.chat.completions.create(**params)
-        msg = completion.choices[0].message
-        # Case 1: 模型触发了工具调用
-        if hasattr(msg, "tool_calls") and msg.tool_calls:
-            return {
-                "type": "tool_call",
-                "tool_name": msg.tool_calls[0].function.name,
-                "tool_args": msg.tool_calls[0].function.arguments
-            }
-
-        if get_json:
-            return msg.content.strip()
-        else:
-            return {
-                "type": "message",
-                "content": msg.content.strip() if msg.content else ""
-            }
+        self.last_usage = record_usage(self.usage, completion)
+        result = parse_completion(completion, get_json, top_logprobs)
+        if cache_key and (cache_if is None or cache_if(result)):
+            self.cache.set(cache_key, result)
+        return result
+
+
+class AsyncLLMCaller:
+    """LLMCaller 的异步版本：同一事件循环中、平台和连接数上限都相同的实例共享一个 httpx.AsyncClient 连接池，
+    每个实例用信号量限制同时在途的请求数。应在要使用它的事件循环内创建。"""
+
+    _http_clients = {}
+
+    def __init__(self, platform, model_name, max_in_flight=64, cache=None):
+        if platform not in PLATFORM_CONFIG:
+            raise ValueError(f"platform must be one of {list(PLATFORM_CONFIG)}, got {platform}")
+        self.platform = platform
+        self.cache = cache
+        self.client = AsyncOpenAI(
+            api_key=get_api_key(platform),
+            base_url=get_base_url(platform),
+            http_client=self.get_http_client(platform, max_in_flight),
+            max_retries=0,
+        )
+        self.model_name = MODEL_DICT.get(model_name).get(platform)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cache_hits": 0}
+        self.last_usage = None  # 最近一次完成的调用的 token 数；并发调用时以完成先后为准
+
+    @staticmethod
+    def _current_loop():
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    @classmethod
+    def get_http_client(cls, platform, max_connections):
+        # 客户端绑定在创建它的事件循环上，连接数上限也在创建时确定，因此按 (平台, 上限, 事件循环) 分别缓存
+        for key in [key for key in cls._http_clients if key[2] is not None and key[2].is_closed()]:
+            del cls._http_clients[key]
+        key = (platform, max_connections, cls._current_loop())
+        if key not in cls._http_clients:
+            cls._http_clients[key] = httpx.AsyncClient(
+                proxy=PROXY if use_proxy(platform) else None,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=httpx.Timeout(600, connect=10),
+            )
+        return cls._http_clients[key]
+
+    @classmethod
+    async def aclose_all(cls):
+        """关闭当前事件循环上（以及在事件循环外创建）的所有共享客户端。"""
+        loop = cls._current_loop()
+        for key in [key for key in cls._http_clients if key[2] in (loop, None)]:
+            await cls._http_clients.pop(key).aclose()
+
+    @retry(wait=wait_random_exponential(min=WAIT_TIME_MIN, max=WAIT_TIME_MAX), stop=stop_after_attempt(ATTEMPT_COUNTER))
+    async def get_response(self, messages, tools, max_tokens=1024, temperature=0., get_json=False, top_logprobs=None,
+                           cache_if=None):
+        params = build_params(self.model_name, messages, tools, max_tokens, temperature, get_json, top_logprobs)
+        cache_key = self.cache.key(self.platform, params) if self.cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.usage["cache_hits"] += 1
+                self.last_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cache_hit": True}
+                return cached
+        async with self.semaphore:
+            completion = await self.client.chat.completions.create(**params)
+        self.last_usage = record_usage(self.usage, completion)
+        result = parse_completion(completion, get_json, top_logprobs)
+        if cache_key and (cache_if is None or cache_if(result)):
+            self.cache.set(cache_key, result)
+        return result
+
+    async def get_responses(self, messages_list, tools=None, return_exceptions=False, **kwargs):
+        return await asyncio.gather(*(self.get_response(messages, tools, **kwargs) for messages in messages_list),
+                                    return_exceptions=return_exceptions)
@@ -0,0 +1,174 @@
+import os
+import threading
+
+import numpy as np
+
+from config import CUISINE_MAP
+from snapshot import ColumnTable, NameIndex, group_index, load_table
+
+
+def build_cuisine_index(cuisine_map):
+    """标签 -> 菜系大类的反向索引；同一标签出现在多个大类时取第一个，与逐类扫描的结果一致。"""
+    index = {}
+    for category, tags in cuisine_map.items():
+        for tag in tags:
+            index.setdefault(tag, category)
+    return index
+
+
+CUISINE_INDEX = build_cuisine_index(CUISINE_MAP)
+
+
+def cuisine_category(tag):
+    return CUISINE_INDEX.get(tag)
+
+
+def preference_key(table, keytag):
+    """倒排表的键：餐厅为所属菜系大类（无法归类时为标签本身），酒店为酒店类型。"""
+    if table == 'restaurant':
+        return cuisine_category(keytag) or keytag
+    return keytag
+
+
+class CityPOIStore:
+    """单个城市的景点/餐厅/酒店数据，首次访问时加载一次并常驻。
+
+    餐厅/酒店的周边查询和名称判断直接读 ColumnTable 的列数组，有快照时这些数组是 mmap，多进程共享页缓存，
+    每次查询只现建返回的那几条记录；按菜系大类/酒店类型过滤时走 (景点, 偏好键) 的倒排表，只取命中的行。
+    景点列表较小且 AttractionSearch 每次都整体返回，物化成记录列表。
+    """
+
+    def __init__(self, city_en, base_dir='database'):
+        self.city_en = city_en
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._attractions = None
+        self._tables = {}
+        self._postings = {}
+        self._names = {}
+        self._locations = None
+
+    def _read(self, table):
+        return load_table(self.city_en, table, self.base_dir)
+
+    def _load_attractions(self):
+        df = self._read('attraction')
+        df['cost'] = df['cost'].astype(float)
+        df = df.fillna(0)
+        self._attractions = df[['name', 'cost']].to_dict(orient='records')
+
+    def _table(self, table):
+        columns = self._tables.get(table)
+        if columns is None:
+            with self._lock:
+                columns = self._tables.get(table)
+                if columns is None:
+                    columns = self._tables[table] = ColumnTable(self.city_en, table, self.base_dir)
+        return columns
+
+    def _load_locations(self):
+        locations = {}
+        for table in ['hotel', 'restaurant', 'attraction']:
+            try:
+                df = self._read(table)
+            except FileNotFoundError:
+                continue
+            if 'location' in df.columns:
+                locations.update({name: loc for name, loc in zip(df['name'], df['location'])
+                                  if isinstance(name, str) and isinstance(loc, str) and ',' in loc})
+        self._locations = locations
+
+    def attractions(self):
+        if self._attractions is None:
+            with self._lock:
+                if self._attractions is None:
+                    self._load_attractions()
+        return self._attractions
+
+    @staticmethod
+    def _record(columns, row):
+        record = {}
+        for col in ['name', 'cost', 'keytag']:
+            value = columns.value(col, row)
+            if col == 'cost' and value is not None:
+                value = float(value)
+            record[col] = 'N/A' if value is None else value
+        return record
+
+    def _load_postings(self, table):
+        """(景点, 偏好键) -> 行号的倒排表，每张表建一次。组合键 景点code * 键个数 + 键code 只保留出现过的，
+        命中的行是 rows[offsets[g]:offsets[g + 1]]，g 为组合键在 groups 中的位置，组内保持原来的行序。"""
+        columns = self._table(table)
+        attraction_codes = np.asarray(columns.column('attraction')[1][0])
+        kind, values = columns.column('keytag')
+        if kind == 'dict':
+            tag_codes, tags = np.asarray(values[0]), [str(tag) for tag in values[1]]
+        else:  # 整列缺失时 pandas 读成数值列
+            tag_codes, tags = np.full(columns.rows, -1, dtype=np.int32), []
+        # 缺失的标签（code -1）取最后一项，与记录中的 'N/A' 一致
+        key_names, tag_keys = np.unique(np.array([preference_key(table, tag) for tag in tags + ['N/A']], dtype=str),
+                                        return_inverse=True)
+        row_keys = tag_keys.reshape(-1)[tag_codes]
+        valid = np.flatnonzero(attraction_codes >= 0)
+        groups, group_codes = np.unique(attraction_codes[valid].astype(np.int64) * len(key_names) + row_keys[valid],
+                                        return_inverse=True)
+        order, offsets = group_index(group_codes.reshape(-1), len(groups))
+        key_index = {str(key): code for code, key in enumerate(key_names)}
+        self._postings[table] = (key_index, groups, valid[order], offsets)
+
+    def _matching_rows(self, table, attraction, keys):
+        if table not in self._postings:
+            with self._lock:
+                if table not in self._postings:
+                    self._load_postings(table)
+        key_index, groups, rows, offsets = self._postings[table]
+        attraction_code = self._table(table).code('attraction', attraction)
+        if attraction_code < 0:
+            return []
+        matched = []
+        for key in set(keys):
+            if key not in key_index:
+                continue
+            target = attraction_code * len(key_index) + key_index[key]
+            g = int(np.searchsorted(groups, target))
+            if g < len(groups) and groups[g] == target:
+                matched.append(rows[offsets[g]:offsets[g + 1]])
+        return sorted(np.concatenate(matched).tolist()) if matched else []
+
+    def _nearby_by_keys(self, table, attraction, keys):
+        columns = self._table(table)
+        rows = columns.group('attraction', attraction) if keys is None else self._matching_rows(table, attraction, keys)
+        return [self._record(columns, row) for row in rows]
+
+    def nearby_restaurants(self, attraction, cuisine_categories=None):
+        return self._nearby_by_keys('restaurant', attraction, cuisine_categories)
+
+    def nearby_hotels(self, attraction, hotel_types=None):
+        return self._nearby_by_keys('hotel', attraction, hotel_types)
+
+    def location(self, name):
+        """amap 原始坐标 'lng,lat'（GCJ-02），数据中没有时返回 None。"""
+        if self._locations is None:
+            with self._lock:
+                if self._locations is None:
+                    self._load_locations()
+        return self._locations.get(name)
+
+    def names(self, table):
+        names = self._names.get(table)
+        if names is None:
+            names = self._names[table] = NameIndex(columns=self._table(table))
+        return names
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_poi_store(city_en, base_dir='database'):
+    key = (os.path.abspath(base_dir), city_en)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(key, CityPOIStore(city_en, base_dir))
+    return store
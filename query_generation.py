@@ -1,16 +1,27 @@
 from config import HOTEL_MAP, CUISINE_MAP, CITY_MAP
-from llm_api import LLMCaller
+from llm_api import LLMCaller, ResponseCache
 
 import argparse
+import os
 import random
+import re
+import threading
 import time
 import json
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
-def random_date(start, end):
+# 难度 -> (旅行天数, 偏好约束个数)
+DIFFICULTY_CONFIG = {
+    "Easy": (1, 0),
+    "Medium": (2, 1),
+    "Hard": (3, 2)
+}
+
+def random_date(start, end, rng=random):
     delta = end - start
-    return start + timedelta(days=random.randint(0, delta.days))
+    return start + timedelta(days=rng.randint(0, delta.days))
 
 def estimate_budget(days, people, hotel_type=None):
     """根据天数、人数和酒店类型估算旅行预算（四舍五入到百位）"""
@@ -32,12 +43,15 @@ def estimate_budget(days, people, hotel_type=None):
     return round(raw / 100) * 100
 
 
-def generate_travel_query(city_name, llm, days, preference_count, difficulty):
-    travel_date = random_date(datetime.today(), datetime.today() + timedelta(days=90)).strftime("%Y-%m-%d")
-    people_number = random.randint(1, 3)
+def build_query_spec(city_name, days, preference_count, difficulty, rng=random, start_date=None):
+    """在 Python 中确定查询的全部结构化字段，返回 (改写提示, 字段)；同一个 rng 种子总是得到相同的结果。"""
+    start_date = start_date or datetime.today()
+    travel_date = random_date(start_date, start_date + timedelta(days=90), rng).strftime("%Y-%m-%d")
+    people_number = rng.randint(1, 3)
 
     if preference_count == 0:
         budget = estimate_budget(days, people_number)
+        preference = {"budget": budget}
         prompt = f"""请根据以下信息创建一个旅行者的查询（query）。
         - 旅行天数：{days} 天
         - 人数：{people_number} 人
@@ -55,10 +69,11 @@ def generate_travel_query(city_name, llm, days, preference_count, difficulty):
            }}"""
 
     elif preference_count == 1:
-        extra_constraint = random.choice(["hotel", "cuisines"])
+        extra_constraint = rng.choice(["hotel", "cuisines"])
         if extra_constraint == "hotel":
-            constraint_value = random.choice(list(HOTEL_MAP.keys()))
+            constraint_value = rng.choice(list(HOTEL_MAP.keys()))
             budget = estimate_budget(days, people_number, hotel_type=constraint_value)
+            preference = {"budget": budget, "hotel": constraint_value}
             preference_str = f"我希望住在{constraint_value}类型的酒店。"
 
             prompt = f"""请根据以下信息创建一个旅行者的查询（query），使用流畅的自然语言文本描述。
@@ -84,7 +99,8 @@ def generate_travel_query(city_name, llm, days, preference_count, difficulty):
 
         else:
             budget = estimate_budget(days, people_number)
-            constraint_value = random.sample(list(CUISINE_MAP.keys()), k=random.randint(1, 3))
+            constraint_value = rng.sample(list(CUISINE_MAP.keys()), k=rng.randint(1, 3))
+            preference = {"budget": budget, "cuisines": constraint_value}
             cuisines_str = "、".join(constraint_value)
             preference_str = f"我想尝试当地的{cuisines_str}菜。"
             prompt = f"""请根据以下信息创建一个旅行者的查询（query），使用流畅的自然语言文本描述。
@@ -108,9 +124,10 @@ def generate_travel_query(city_name, llm, days, preference_count, difficulty):
             }}
             """
     else:
-        selected_cuisines = random.sample(list(CUISINE_MAP.keys()), k=random.randint(1, 3))
-        selected_hotel = random.choice(list(HOTEL_MAP.keys()))
+        selected_cuisines = rng.sample(list(CUISINE_MAP.keys()), k=rng.randint(1, 3))
+        selected_hotel = rng.choice(list(HOTEL_MAP.keys()))
         budget = estimate_budget(days, people_number, hotel_type=selected_hotel)
+        preference = {"budget": budget, "cuisines": selected_cuisines, "hotel": selected_hotel}
         prompt = f"""请根据以下信息创建一个旅行者的查询（query），使用流畅的自然语言文本描述。
             - 旅行天数：{days} 天
             - 人数：{people_number} 人
@@ -134,50 +151,290 @@ def generate_travel_query(city_name, llm, days, preference_count, difficulty):
             }}"""
 
 
-    messages = [{"role": "system", "content": "你是一个擅长生成旅行查询的助手。"},
-                {"role": "user", "content": prompt}]
+    fields = {"days": days, "people_number": people_number, "date": travel_date,
+              "preference_constraint": preference, "level": difficulty}
+    return prompt, fields
+
 
+def parse_query_reply(response, fields):
+    """解析单条生成的回复并校验，返回 (查询, 错误信息)；通过时错误信息为 None。"""
     try:
-        response = llm.get_response(messages, tools=None, max_tokens=1024, temperature=0.2, get_json=True)
         travel_query = json.loads(response)
-        travel_query["level"] = difficulty
+    except (TypeError, ValueError) as e:
+        return None, f"回复不是合法的JSON：{e}"
+    if not isinstance(travel_query, dict):
+        return None, "回复不是JSON对象"
+    return travel_query, validate_query(travel_query.get("query"), fields)
+
+
+def generate_travel_query(city_name, llm, days, preference_count, difficulty, rng=random, start_date=None,
+                          max_retries=0, limiter=None):
+    prompt, fields = build_query_spec(city_name, days, preference_count, difficulty, rng, start_date)
+    messages = [{"role": "system", "content": "你是一个擅长生成旅行查询的助手。"},
+                {"role": "user", "content": prompt}]
+
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.wait()
+        try:
+            # 只缓存通过校验的回复，否则重试（及续跑）时会一直从缓存取回同一个不合格的回复
+            response = llm.get_response(messages, tools=None, max_tokens=1024, temperature=0.2, get_json=True,
+                                        cache_if=lambda r: parse_query_reply(r, fields)[1] is None)
+        except Exception as e:
+            print(f"[错误] 第{attempt + 1}次生成失败：{e}")
+            continue
+        travel_query, error = parse_query_reply(response, fields)
+        if error:
+            print(f"[校验失败] 第{attempt + 1}次：{error}")
+            continue
+        travel_query.update(fields)  # 结构化字段以 Python 中确定的为准，LLM 只负责生成自然语言的 query
         return travel_query
-    except Exception as e:
-        print(f"[错误] 生成失败：{e}")
-        return None
+    return None
+
+NUMERALS = {1: ['1', '一'], 2: ['2', '二', '两'], 3: ['3', '三']}
+
+
+def describe_constraints(fields):
+    preference = fields["preference_constraint"]
+    lines = [f"旅行天数：{fields['days']}天", f"人数：{fields['people_number']}人",
+             f"旅行开始日期：{fields['date']}", f"预算：{preference['budget']}元"]
+    if preference.get("cuisines"):
+        lines.append(f"饮食偏好：{'、'.join(preference['cuisines'])}")
+    if preference.get("hotel"):
+        lines.append(f"住宿偏好：{preference['hotel']}类型的酒店")
+    return "；".join(lines)
+
+
+def build_batch_prompt(city_name, fields_list):
+    records = "\n".join(f"[{i}] {describe_constraints(fields)}" for i, fields in enumerate(fields_list))
+    return f"""下面是{len(fields_list)}条{city_name}旅行需求，请为每一条创建一个旅行者的查询（query），使用流畅的自然语言文本描述。
+{records}
+### 要求
+1. 用真实用户的语气表达需求，使每条 query 自然、富有变化，彼此之间不要雷同。
+2. 每条 query 必须完整包含该条的全部约束：天数写成“N天”，人数写成“N人”，日期保持 YYYY-MM-DD 格式，预算写阿拉伯数字，
+   饮食偏好和住宿偏好使用给出的原词。
+3. 输出JSON结构，queries 按编号顺序给出全部{len(fields_list)}条，格式如下：
+{{"queries": [{{"id": 0, "query": "..."}}, {{"id": 1, "query": "..."}}]}}"""
+
+
+def validate_query(text, fields):
+    """检查改写后的 query 是否完整表达了记录中的约束，返回错误信息，通过时返回 None。"""
+    if not isinstance(text, str) or not text.strip():
+        return "query 为空"
+    text = re.sub(r"[\s,]", "", text)  # “2 天”“3,000元”之类的写法也算
+    preference = fields["preference_constraint"]
+    if not any(f"{n}{unit}" in text for n in NUMERALS.get(fields['days'], [str(fields['days'])]) for unit in ['天', '日游']):
+        return "缺少天数"
+    if not any(f"{n}{unit}" in text for n in NUMERALS.get(fields['people_number'], [str(fields['people_number'])])
+               for unit in ['人', '位', '个人']):
+        return "缺少人数"
+    if fields['date'] not in text:
+        return "缺少日期"
+    if str(preference['budget']) not in text:
+        return "缺少预算"
+    if preference.get("hotel") and preference["hotel"] not in text:
+        return "缺少住宿偏好"
+    for cuisine in preference.get("cuisines") or []:
+        if cuisine not in text:
+            return f"缺少饮食偏好 {cuisine}"
+    return None
+
+
+def to_query_record(fields, query):
+    record = {k: v for k, v in fields.items() if k != "level"}
+    record["query"] = query
+    record["level"] = fields["level"]
+    return record
+
+
+def parse_batch_reply(response):
+    """批量回复 -> {编号: query}；无法解析时返回空字典。"""
+    try:
+        items = json.loads(response)["queries"]
+    except (TypeError, ValueError, KeyError) as e:
+        print(f"[错误] 批量回复无法解析：{e}")
+        return {}
+    queries = {}
+    for item in items if isinstance(items, list) else []:
+        # 模型可能把编号写成字符串（"0"），统一转成整数；无法识别编号的条目直接忽略
+        if isinstance(item, dict) and str(item.get("id")).strip().isdigit():
+            queries[int(str(item["id"]).strip())] = item.get("query")
+    return queries
+
+
+def generate_travel_queries_batch(city_name, llm, fields_list, max_retries=2, limiter=None):
+    """一次请求改写多条记录，逐条校验；只把未通过校验的记录重新打包重试。返回与 fields_list 对齐的结果，失败为 None。"""
+    results = [None] * len(fields_list)
+    pending = list(range(len(fields_list)))
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if limiter:
+            limiter.wait()
+        batch = [fields_list[i] for i in pending]
+        messages = [{"role": "system", "content": "你是一个擅长生成旅行查询的助手。"},
+                    {"role": "user", "content": build_batch_prompt(city_name, batch)}]
+
+        def all_valid(response):
+            queries = parse_batch_reply(response)
+            return all(validate_query(queries.get(local_id), fields) is None for local_id, fields in enumerate(batch))
+
+        try:
+            # 只缓存每条都通过校验的回复；否则同一批记录重试（及续跑）时会一直取回缓存中的同一个回复
+            response = llm.get_response(messages, tools=None, max_tokens=256 * len(pending) + 256, temperature=0.2,
+                                        get_json=True, cache_if=all_valid)
+        except Exception as e:
+            print(f"[错误] 第{attempt + 1}次批量生成失败：{e}")
+            continue
+        queries = parse_batch_reply(response)
+        failed = []
+        for local_id, i in enumerate(pending):
+            error = validate_query(queries.get(local_id), fields_list[i])
+            if error:
+                failed.append(i)
+                print(f"[校验失败] 第{attempt + 1}次：{error}")
+            else:
+                results[i] = to_query_record(fields_list[i], queries[local_id])
+        pending = failed
+    return results
+
+
+class RateLimiter:
+    """所有 worker 共享：相邻两次请求的发出时间至少间隔 min_interval 秒。"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def plan_items(total_number):
+    difficulty_plan = {
+        "Easy": int(total_number * 0.5),
+        "Medium": int(total_number * 0.3),
+        "Hard": total_number - int(total_number * 0.5) - int(total_number * 0.3)
+    }
+    return [(f"{level}-{i}", level) for level, count in difficulty_plan.items() for i in range(count)]
+
+
+def item_rng(seed, city_en, item_id):
+    # 每条查询独立的随机数生成器，结构化字段与生成顺序、并发度无关
+    return random.Random(f"{seed}-{city_en}-{item_id}")
+
+
+def load_generated(path):
+    """读取流式输出，返回 (生成参数头, {item: 记录})；头记录本次数据集的种子和起始日期，续跑时据此复用。"""
+    header, generated = None, {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:  # 中断时可能写了半行
+                    continue
+                if "header" in record:
+                    header = record["header"]
+                else:
+                    generated[record["item"]] = record
+    return header, generated
+
+
+def resolve_header(header, seed, start_date):
+    """新数据集用命令行参数（起始日期默认今天）生成参数头；续跑时沿用已有的头，命令行显式给出且不一致时报错。"""
+    if header is None:
+        return {"seed": seed if seed is not None else 0,
+                "start_date": start_date or datetime.today().strftime("%Y-%m-%d")}, True
+    for key, value in [("seed", seed), ("start_date", start_date)]:
+        if value is not None and header.get(key) != value:
+            raise ValueError(f"{key}={value} 与已有输出中的 {header.get(key)} 不一致，续跑请保持一致或换一个输出文件")
+    return header, False
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--city_en', type=str, default='beijing')
+    parser.add_argument('--platform', type=str, default='OpenAI')
+    parser.add_argument('--model_name', type=str, default='gpt-4o-mini')
+    parser.add_argument('--llm_cache', action='store_true', help='缓存 LLM 回复（含 temperature>0 的请求），重跑时直接复用')
+    parser.add_argument('--num_queries', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None, help='默认 0；续跑时沿用输出文件中记录的种子')
+    parser.add_argument('--start_date', type=str, default=None,
+                        help='出行日期的起始日（YYYY-MM-DD），默认今天；续跑时沿用输出文件中记录的日期')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--min_interval', type=float, default=0., help='所有 worker 合计两次请求之间的最小间隔（秒），0 为不限速')
+    parser.add_argument('--batch_size', type=int, default=1, help='每次请求改写的查询数，>1 时启用批量模式')
+    parser.add_argument('--max_retries', type=int, default=2, help='未通过校验的查询的最大重试次数')
     args = parser.parse_args()
 
     city_en = args.city_en
     city_zh = CITY_MAP[city_en]
-    llm = LLMCaller(platform='XiaoAi', model_name='gpt-4o-mini')
+    llm = LLMCaller(platform=args.platform, model_name=args.model_name,
+                    cache=ResponseCache(cache_sampling=True) if args.llm_cache else None)
 
-    total_number = 100
-    data = []
+    output_path = f"../database/{city_en}/travel_queries.csv"
+    stream_path = f"../database/{city_en}/travel_queries.jsonl"
+    items = plan_items(args.num_queries)
+    header, generated = load_generated(stream_path)
+    header, is_new = resolve_header(header, args.seed, args.start_date)
+    if is_new:
+        with open(stream_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"header": header}, ensure_ascii=False) + "\n")
+    seed = header["seed"]
+    start_date = datetime.strptime(header["start_date"], "%Y-%m-%d")
+    print(f"种子 {seed}，出行日期起始日 {header['start_date']}")
+    pending = [(item_id, level) for item_id, level in items if item_id not in generated]
+    print(f"已生成 {len(items) - len(pending)} 条，待生成 {len(pending)} 条")
 
-    difficulty_plan = {
-        "Easy": int(total_number * 0.5),
-        "Medium": int(total_number * 0.3),
-        "Hard": total_number - int(total_number * 0.5) - int(total_number * 0.3)
-    }
+    limiter = RateLimiter(args.min_interval) if args.min_interval > 0 else None
+    lock = threading.Lock()
 
-    difficulty_config = {
-        "Easy": (1, 0),
-        "Medium": (2, 1),
-        "Hard": (3, 2)
-    }
+    def generate_one(item_id, level):
+        days, pref_count = DIFFICULTY_CONFIG[level]
+        query = generate_travel_query(city_zh, llm, days, pref_count, level,
+                                      rng=item_rng(seed, city_en, item_id), start_date=start_date,
+                                      max_retries=args.max_retries, limiter=limiter)
+        if query:
+            record = {"item": item_id, **query}
+            with lock:
+                with open(stream_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                generated[item_id] = record
+        return [(item_id, query is not None)]
+
+    def generate_chunk(chunk):
+        fields_list = [build_query_spec(city_zh, *DIFFICULTY_CONFIG[level], level,
+                                        rng=item_rng(seed, city_en, item_id), start_date=start_date)[1]
+                       for item_id, level in chunk]
+        queries = generate_travel_queries_batch(city_zh, llm, fields_list, args.max_retries, limiter)
+        with lock:
+            with open(stream_path, 'a', encoding='utf-8') as f:
+                for (item_id, _), query in zip(chunk, queries):
+                    if query:
+                        record = {"item": item_id, **query}
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        generated[item_id] = record
+        return [(item_id, query is not None) for (item_id, _), query in zip(chunk, queries)]
 
-    for level, count in difficulty_plan.items():
-        days, pref_count = difficulty_config[level]
-        for i in range(count):
-            print(f"生成 [{level}] 查询 {i+1}/{count} ...")
-            query = generate_travel_query(city_zh, llm, days, pref_count, level)
-            if query:
-                data.append(query)
-            time.sleep(0.5)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        if args.batch_size <= 1:
+            futures = [executor.submit(generate_one, item_id, level) for item_id, level in pending]
+        else:
+            futures = [executor.submit(generate_chunk, pending[i:i + args.batch_size])
+                       for i in range(0, len(pending), args.batch_size)]
+        i = 0
+        for future in as_completed(futures):
+            for item_id, ok in future.result():
+                i += 1
+                print(f"[{i}/{len(pending)}] 查询 {item_id} " + ("生成成功" if ok else "生成失败，重跑时会重试"))
 
+    data = [{k: v for k, v in generated[item_id].items() if k != "item"} for item_id, _ in items if item_id in generated]
     df = pd.DataFrame(data)
-    df.to_csv(f"../database/{city_en}/travel_queries.csv", index=False, encoding="utf-8-sig")
\ No newline at end of file
+    df.to_csv(output_path, index=False, encoding="utf-8-sig")
@@ -1,10 +1,78 @@
-from travel_agent import ReActTravelAgent
+from config import TRANSPORT_MODE, OBSERVATION_ENCODING
+from travel_agent import ReActTravelAgent, STEP_MODES
+from context import CONTEXT_STRATEGIES
+from llm_api import ResponseCache
+from tools import set_transport_mode, TRANSPORT_MODES, set_observation_encoding, OBSERVATION_ENCODINGS
+from tracing import Tracer, TRACE_FORMATS
+from travel_bench.trip_eval import parse_preference
 
 import argparse
 import os
 import json
+import threading
 import pandas as pd
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def run_query(agent, idx, query, trace_dir=None, trace_format='jsonl', budget=None):
+    if trace_dir:
+        agent.tracer = Tracer()
+    usage_before = dict(agent.llm.usage)
+    t1 = time.time()
+    try:
+        plan = agent.plan_trip(query, budget=budget)
+        status = 'finished' if agent.finished else 'halted'
+    except Exception as e:
+        print(f'PLAN {idx} 生成失败：{e}')
+        plan, status = "", 'error'
+    record = {
+        "idx": int(idx),
+        "status": status,
+        "steps": agent.step_n - 1,
+        "wall_time": time.time() - t1,
+        "usage": {k: v - usage_before.get(k, 0) for k, v in agent.llm.usage.items()},
+        "plan": plan,
+    }
+    if agent.context.decisions:
+        record["context_decisions"] = agent.context.decisions
+    if agent.notebook.violations:
+        record["notebook_violations"] = agent.notebook.violations
+    if trace_dir:
+        record["trace_summary"] = agent.tracer.summary()
+        agent.tracer.export(os.path.join(trace_dir, f"{int(idx)}.{'json' if trace_format == 'chrome' else 'jsonl'}"),
+                            trace_format)
+    return record
+
+
+def append_record(path, record, lock):
+    line = json.dumps(record, ensure_ascii=False)
+    with lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_records(path):
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # 中断时可能写了半行
+                continue
+            records[record["idx"]] = record
+    return records
+
+
+def compact(records, index, output_file_path):
+    generated_plans = {idx: records[idx]["plan"] if idx in records else "" for idx in index}
+    with open(output_file_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(generated_plans, ensure_ascii=False, indent=4, separators=(',', ':')))
+
 
 if __name__ == '__main__':
 
@@ -12,23 +80,72 @@ if __name__ == '__main__':
     parser.add_argument('--city_en', type=str, default='beijing')
     parser.add_argument('--platform', type=str, default='OpenAI')
     parser.add_argument('--model_name', type=str, default='gpt-4o-mini')
+    parser.add_argument('--transport_mode', type=str, default=TRANSPORT_MODE, choices=TRANSPORT_MODES)
+    parser.add_argument('--obs_encoding', type=str, default=OBSERVATION_ENCODING, choices=OBSERVATION_ENCODINGS)
+    parser.add_argument('--workers', type=int, default=1, help='并发规划的查询数，每个查询使用独立的 agent 和笔记本')
+    parser.add_argument('--step_mode', type=str, default='react', choices=STEP_MODES)
+    parser.add_argument('--context', type=str, default='prune', choices=list(CONTEXT_STRATEGIES))
+    parser.add_argument('--context_budget', type=int, default=6000, help='token_budget 策略下每次调用的 token 预算')
+    parser.add_argument('--llm_cache', action='store_true', help='缓存 temperature=0 的 LLM 回复，重跑时直接复用')
+    parser.add_argument('--retry_errors', action='store_true', help='重跑检查点中状态为 error 的查询')
+    parser.add_argument('--notebook_validation', action='store_true',
+                        help='写入笔记本时校验 POI 名称与重复，不合规的写入直接在 Observation 中返回原因；超出预算只提示不拒绝')
+    parser.add_argument('--trace', type=str, default=None, choices=TRACE_FORMATS,
+                        help='记录每一步的耗时与 token 数，按查询导出到输出目录下的 traces/')
     args = parser.parse_args()
+    set_transport_mode(args.transport_mode)
+    set_observation_encoding(args.obs_encoding)
+    context_kwargs = {'budget': args.context_budget} if args.context == 'token_budget' else None
+    llm_cache = ResponseCache() if args.llm_cache else None
     city_en = args.city_en
     platform = args.platform
     model_name = args.model_name
 
-    agent = ReActTravelAgent(platform, model_name)
     travel_queries = pd.read_csv(f'database/{city_en}/travel_queries.csv')
-    generated_plans = {}
-    t1 = time.time()
-    for idx, row in travel_queries.iterrows():
-        print(f'CITY: {city_en}, MODEL: {model_name}, PLAN: {idx}')
-        result = agent.plan_trip(row['query'])
-        generated_plans[idx] = result
     output_dir = os.path.join('output', city_en, model_name)
     os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, 'generated_plans.jsonl')
     output_file_path = os.path.join(output_dir, 'generated_plans.json')
-    with open(output_file_path, "w", encoding="utf-8") as f:
-        f.write(json.dumps(generated_plans, ensure_ascii=False, indent=4, separators=(',', ':')))
+    trace_dir = os.path.join(output_dir, 'traces') if args.trace else None
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    records = load_records(checkpoint_path)
+    done = {idx for idx, r in records.items() if not (args.retry_errors and r["status"] == 'error')}
+    pending = [(idx, row['query'], (parse_preference(row['preference_constraint']) or {}).get('budget')
+                if args.notebook_validation else None)
+               for idx, row in travel_queries.iterrows() if idx not in done]
+    print(f'检查点中已有 {len(done)} 个结果，待生成 {len(pending)} 个')
+
+    def new_agent():
+        return ReActTravelAgent(platform, model_name, step_mode=args.step_mode, context_strategy=args.context,
+                                context_kwargs=context_kwargs, llm_cache=llm_cache,
+                                notebook_validation=args.notebook_validation, city_en=city_en)
+
+    lock = threading.Lock()
+    t1 = time.time()
+    if args.workers <= 1:
+        agent = new_agent()
+        for idx, query, budget in pending:
+            print(f'CITY: {city_en}, MODEL: {model_name}, PLAN: {idx}')
+            record = run_query(agent, idx, query, trace_dir, args.trace, budget)
+            append_record(checkpoint_path, record, lock)
+            records[record["idx"]] = record
+    else:
+        def plan_one(idx, query, budget):
+            print(f'CITY: {city_en}, MODEL: {model_name}, PLAN: {idx}')
+            record = run_query(new_agent(), idx, query, trace_dir, args.trace, budget)
+            append_record(checkpoint_path, record, lock)
+            return record
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(plan_one, idx, query, budget) for idx, query, budget in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                records[record["idx"]] = record
+
+    compact(records, travel_queries.index, output_file_path)
     t2 = time.time()
-    print(f'计划生成耗时：{(t2-t1)/3600}小时')
\ No newline at end of file
+    print(f'计划生成耗时：{(t2-t1)/3600}小时')
+    if llm_cache:
+        print(f'LLM 缓存：{llm_cache.stats()}')
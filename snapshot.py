@@ -0,0 +1,218 @@
+"""amap 缓存的列式二进制快照：数值列存为 .npy，字符串列做字典编码（codes + 排序后的字典），读取时 mmap。
+
+    python snapshot.py --city_en=beijing
+"""
+from config import CITY_MAP
+
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+TABLES = ['attraction', 'restaurant', 'hotel']
+GROUP_COLUMNS = ['attraction']  # 建分组索引的列：餐厅/酒店按所属景点取行
+
+
+def csv_path(city_en, table, base_dir='database'):
+    return os.path.join(base_dir, city_en, 'amap', f'{table}_cache.csv')
+
+
+def snapshot_dir(city_en, table, base_dir='database'):
+    return os.path.join(base_dir, city_en, 'amap', 'snapshot', table)
+
+
+def snapshot_exists(city_en, table, base_dir='database'):
+    return os.path.exists(os.path.join(snapshot_dir(city_en, table, base_dir), 'meta.json'))
+
+
+def encode_column(series):
+    """数值列返回 ('numeric', values)；其余列做字典编码，返回 ('dict', (codes, 排序后的字典))，缺失值的 code 为 -1。"""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return 'numeric', series.to_numpy()
+    values = series.map(lambda x: x if pd.isna(x) else str(x))
+    categories = np.array(sorted(values.dropna().unique()), dtype=str)
+    codes = np.searchsorted(categories, values.fillna('').to_numpy(dtype=str)).astype(np.int32)
+    codes[values.isna().to_numpy()] = -1
+    return 'dict', (codes, categories)
+
+
+def group_index(codes, size):
+    """按 code 分组的行号索引：code 为 c 的行是 order[offsets[c]:offsets[c + 1]]，组内保持原来的行序。"""
+    codes = np.asarray(codes)
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind='stable')].astype(np.int32)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[valid], minlength=size), out=offsets[1:])
+    return order, offsets
+
+
+def _save_column(out_dir, col, series):
+    kind, values = encode_column(series)
+    if kind == 'numeric':
+        np.save(os.path.join(out_dir, f'{col}.npy'), values)
+        return kind
+    codes, categories = values
+    np.save(os.path.join(out_dir, f'{col}.codes.npy'), codes)
+    np.save(os.path.join(out_dir, f'{col}.dict.npy'), categories)
+    if col in GROUP_COLUMNS:
+        order, offsets = group_index(codes, len(categories))
+        np.save(os.path.join(out_dir, f'{col}.order.npy'), order)
+        np.save(os.path.join(out_dir, f'{col}.offsets.npy'), offsets)
+    return kind
+
+
+def build_table_snapshot(city_en, table, base_dir='database'):
+    df = pd.read_csv(csv_path(city_en, table, base_dir), index_col=None)
+    out_dir = snapshot_dir(city_en, table, base_dir)
+    tmp_dir = f'{out_dir}.tmp.{os.getpid()}'
+    old_dir = f'{out_dir}.old.{os.getpid()}'
+    for path in (tmp_dir, old_dir):  # 同一进程号上次中断时可能留下的目录
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = {col: _save_column(tmp_dir, col, df[col]) for col in df.columns}
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'rows': len(df), 'columns': columns}, f, ensure_ascii=False)
+    # 先把旧快照整体改名挪开再换入新目录，读者看到的要么是完整的旧快照，要么是完整的新快照；
+    # 已经 mmap 的旧文件在删除后仍然有效
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return len(df)
+
+
+def build_snapshot(city_en, base_dir='database'):
+    return {table: build_table_snapshot(city_en, table, base_dir) for table in TABLES
+            if os.path.exists(csv_path(city_en, table, base_dir))}
+
+
+def _load_meta(city_en, table, base_dir):
+    with open(os.path.join(snapshot_dir(city_en, table, base_dir), 'meta.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_column(city_en, table, col, base_dir='database'):
+    """返回 ('numeric', values) 或 ('dict', (codes, categories))，数组均为 mmap。"""
+    path = snapshot_dir(city_en, table, base_dir)
+    kind = _load_meta(city_en, table, base_dir)['columns'][col]
+    if kind == 'numeric':
+        return kind, np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r')
+    codes = np.load(os.path.join(path, f'{col}.codes.npy'), mmap_mode='r')
+    categories = np.load(os.path.join(path, f'{col}.dict.npy'), mmap_mode='r')
+    return kind, (codes, categories)
+
+
+def load_table(city_en, table, base_dir='database', columns=None):
+    if not snapshot_exists(city_en, table, base_dir):
+        return pd.read_csv(csv_path(city_en, table, base_dir), index_col=None, usecols=columns)
+    meta = _load_meta(city_en, table, base_dir)
+    data = {}
+    for col in columns or meta['columns']:
+        kind, values = load_column(city_en, table, col, base_dir)
+        if kind == 'numeric':
+            data[col] = np.asarray(values)
+        else:
+            codes, categories = values
+            data[col] = pd.Categorical.from_codes(np.asarray(codes), categories=np.asarray(categories)).astype(object)
+    return pd.DataFrame(data)
+
+
+class ColumnTable:
+    """单张表的列式只读视图。有快照时各列直接是 mmap 数组，多个进程共享同一份页缓存；
+    没有快照时由 CSV 按同样的方式在内存中编码。餐厅/酒店按景点取行走 GROUP_COLUMNS 的分组索引。"""
+
+    def __init__(self, city_en, table, base_dir='database'):
+        self.city_en = city_en
+        self.table = table
+        self.base_dir = base_dir
+        self.mmapped = snapshot_exists(city_en, table, base_dir)
+        self._columns = {}
+        self._groups = {}
+        if self.mmapped:
+            meta = _load_meta(city_en, table, base_dir)
+            self.rows = meta['rows']
+            self.names = list(meta['columns'])
+        else:
+            df = pd.read_csv(csv_path(city_en, table, base_dir), index_col=None)
+            self.rows = len(df)
+            self.names = list(df.columns)
+            self._columns = {col: encode_column(df[col]) for col in df.columns}
+
+    def column(self, col):
+        if col not in self._columns:
+            self._columns[col] = load_column(self.city_en, self.table, col, self.base_dir)
+        return self._columns[col]
+
+    def value(self, col, row):
+        """第 row 行的值，缺失值（空字符串列或 NaN）返回 None。"""
+        kind, values = self.column(col)
+        if kind == 'numeric':
+            value = values[row].item()
+            return None if value != value else value
+        codes, categories = values
+        code = codes[row]
+        return None if code < 0 else str(categories[code])
+
+    def code(self, col, value):
+        """字典列中 value 的 code，不存在时返回 -1。"""
+        categories = self.column(col)[1][1]
+        if not isinstance(value, str) or len(categories) == 0:
+            return -1
+        pos = int(np.searchsorted(categories, value))
+        return pos if pos < len(categories) and categories[pos] == value else -1
+
+    def group(self, col, value):
+        """col 列等于 value 的行号，按原来的行序。"""
+        code = self.code(col, value)
+        if code < 0:
+            return []
+        order, offsets = self._group_index(col)
+        return order[offsets[code]:offsets[code + 1]].tolist()
+
+    def _group_index(self, col):
+        if col not in self._groups:
+            path = os.path.join(snapshot_dir(self.city_en, self.table, self.base_dir), col)
+            if self.mmapped and os.path.exists(f'{path}.order.npy'):
+                self._groups[col] = (np.load(f'{path}.order.npy', mmap_mode='r'),
+                                     np.load(f'{path}.offsets.npy', mmap_mode='r'))
+            else:  # CSV 或旧版快照：在内存中现建
+                codes, categories = self.column(col)[1]
+                self._groups[col] = group_index(codes, len(categories))
+        return self._groups[col]
+
+
+class NameIndex:
+    """名称集合的成员判断，在排序后的名称字典上二分查找（有快照时即 mmap 数组）。"""
+
+    def __init__(self, city_en=None, table=None, base_dir='database', columns=None):
+        self._columns = columns if columns is not None else ColumnTable(city_en, table, base_dir)
+        self._set = None
+
+    def as_set(self):
+        """物化为 Python 集合，适合需要大量成员判断的批量校验。"""
+        if self._set is None:
+            self._set = set(self._columns.column('name')[1][1].tolist())
+        return self._set
+
+    def __contains__(self, name):
+        return self._columns.code('name', name) >= 0
+
+    def __iter__(self):
+        return iter(self._columns.column('name')[1][1].tolist())
+
+    def __len__(self):
+        return len(self._columns.column('name')[1][1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city_en', type=str, default='beijing', choices=list(CITY_MAP) + ['all'])
+    parser.add_argument('--base_dir', type=str, default='database')
+    args = parser.parse_args()
+
+    cities = list(CITY_MAP) if args.city_en == 'all' else [args.city_en]
+    for city_en in cities:
+        rows = build_snapshot(city_en, args.base_dir)
+        print(f"{city_en}: {rows} -> {os.path.join(args.base_dir, city_en, 'amap', 'snapshot')}")
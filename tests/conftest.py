@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'travel_bench'))
+
+os.environ.setdefault('BAIDU_API_KEY', 'test')
+import config  # noqa: E402
+
+# tools 在导入时打开 ROOT_PATH 下的交通/坐标缓存，测试中指向临时目录
+config.ROOT_PATH = tempfile.mkdtemp(prefix='citygpt-travel-test-')
+
+CITY_EN = 'beijing'
+
+ATTRACTIONS = [
+    {"name": "故宫", "cost": 60, "location": "116.397,39.918"},
+    {"name": "天坛", "cost": 15, "location": "116.410,39.882"},
+    {"name": "颐和园", "cost": 30, "location": "116.275,39.999"},
+    {"name": "景山公园", "cost": None, "location": "116.396,39.925"},
+]
+
+RESTAURANTS = [
+    {"attraction": "故宫", "name": "四季民福", "cost": 120, "keytag": "北京菜", "location": "116.40,39.91"},
+    {"attraction": "天坛", "name": "便宜坊", "cost": 90, "keytag": "北京菜", "location": "116.41,39.88"},
+    {"attraction": "故宫", "name": "吉野家", "cost": 35, "keytag": "快餐厅", "location": "116.40,39.92"},
+    {"attraction": "故宫", "name": "寿司郎", "cost": 80, "keytag": "寿司", "location": "116.39,39.92"},
+    {"attraction": "天坛", "name": "炸酱面馆", "cost": None, "keytag": None, "location": "116.41,39.88"},
+    {"attraction": "故宫", "name": "沙拉工坊", "cost": 45, "keytag": "沙拉", "location": "116.40,39.92"},
+    {"attraction": "颐和园", "name": "听鹂馆", "cost": 200, "keytag": "北京菜", "location": "116.27,39.99"},
+]
+
+HOTELS = [
+    {"attraction": "故宫", "name": "北京饭店", "cost": 800, "keytag": "高档型", "location": "116.41,39.91"},
+    {"attraction": "天坛", "name": "天坛饭店", "cost": 500, "keytag": "舒适型", "location": "116.41,39.88"},
+    {"attraction": "故宫", "name": "如家", "cost": 200, "keytag": "经济型", "location": "116.40,39.92"},
+]
+
+
+def write_city(base_dir, city_en=CITY_EN):
+    amap_dir = os.path.join(base_dir, city_en, 'amap')
+    os.makedirs(amap_dir, exist_ok=True)
+    for table, rows in [('attraction', ATTRACTIONS), ('restaurant', RESTAURANTS), ('hotel', HOTELS)]:
+        pd.DataFrame(rows).to_csv(os.path.join(amap_dir, f'{table}_cache.csv'), index=False)
+    return base_dir
+
+
+@pytest.fixture
+def database_dir(tmp_path):
+    return write_city(str(tmp_path / 'database'))
+
+
+@pytest.fixture
+def in_database_dir(database_dir, monkeypatch):
+    """工具和笔记本按相对路径 database/ 读取数据，切换到临时数据目录的上一级。"""
+    monkeypatch.chdir(os.path.dirname(database_dir))
+    return database_dir
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+
+from context import AppendOnlyContext, TokenBudgetContext, count_tokens, make_context
+
+SYSTEM = {"role": "system", "content": "你是一个旅行规划助手。"}
+QUERY = {"role": "user", "content": "请帮我规划北京两日游，预算4000元。"}
+CONTROL = {"role": "user", "content": "请给出下一步的 Thought。"}
+
+
+def step(n, observation_chars=400):
+    return [{"role": "assistant", "content": f"Thought {n}: 查询第{n}个景点附近的餐厅。"},
+            {"role": "assistant", "content": f"Action {n}: NearbyRestaurantSearch"},
+            {"role": "assistant", "content": f"Observation {n}: " + "餐厅名称，人均消费，菜系；" * (observation_chars // 12)}]
+
+
+def history(steps, observation_chars=400):
+    messages = [SYSTEM, QUERY]
+    for n in range(steps):
+        messages += step(n, observation_chars)
+    return messages
+
+
+def tokens(view):
+    return sum(count_tokens(msg['content']) for msg in view)
+
+
+def test_under_budget_keeps_everything():
+    context = TokenBudgetContext(budget=100000)
+    messages = history(3)
+    assert context.build(messages, CONTROL) == messages + [CONTROL]
+    decision = context.decisions[-1]
+    assert (decision["summarized"], decision["dropped"], decision["evicted"], decision["truncated"]) == ([], [], [], [])
+    assert decision["over_budget"] is False and decision["kept"] == len(messages) + 1
+
+
+def test_summarizes_then_drops_oldest_observations():
+    messages = history(4)
+    full = tokens(messages + [CONTROL])
+    context = TokenBudgetContext(budget=full - 50, summary_chars=40)
+    view = context.build(messages, CONTROL)
+    decision = context.decisions[-1]
+    assert decision["summarized"] == [4] and decision["dropped"] == []
+    assert view[4]["content"].startswith("Observation 0") and "已省略" in view[4]["content"]
+    assert tokens(view) == decision["tokens_after"] <= context.budget
+
+    without_old_observations = [msg for msg in messages if "Observation" not in msg["content"] or msg is messages[-1]]
+    context = TokenBudgetContext(budget=tokens(without_old_observations + [CONTROL]) + 40, summary_chars=40)
+    view = context.build(messages, CONTROL)
+    decision = context.decisions[-1]
+    assert decision["dropped"] and decision["evicted"] == [] and decision["truncated"] == []
+    assert view[-2] == messages[-1]  # 最新的 Observation 原样保留
+    assert tokens(view) <= context.budget
+
+
+def test_evicts_thought_action_groups_after_observations():
+    messages = history(6)
+    context = TokenBudgetContext(budget=tokens([SYSTEM, QUERY, CONTROL] + step(5)) + 30)
+    view = context.build(messages, CONTROL)
+    decision = context.decisions[-1]
+    assert decision["dropped"] == [4, 7, 10, 13, 16]
+    assert decision["evicted"] and decision["truncated"] == []
+    assert view[:2] == [SYSTEM, QUERY] and view[-4:] == step(5) + [CONTROL]
+    assert tokens(view) <= context.budget
+
+
+def test_truncates_a_single_oversized_observation():
+    messages = [SYSTEM, QUERY] + step(0, observation_chars=20000)
+    context = TokenBudgetContext(budget=1000, summary_chars=80)
+    view = context.build(messages, CONTROL)
+    decision = context.decisions[-1]
+    assert decision["truncated"] == [4] and decision["over_budget"] is False
+    assert decision["tokens_before"] > 1000 >= decision["tokens_after"] == tokens(view)
+    assert view[4]["content"].startswith("Observation 0") and "已省略" in view[4]["content"]
+    assert messages[4]["content"] != view[4]["content"]  # 历史本身不被改写
+
+
+def test_truncation_keeps_summary_chars_and_reports_over_budget():
+    messages = [SYSTEM, QUERY] + step(0, observation_chars=20000)
+    context = TokenBudgetContext(budget=10, summary_chars=80)
+    view = context.build(messages, CONTROL)
+    decision = context.decisions[-1]
+    assert decision["truncated"] == [4] and decision["over_budget"] is True
+    assert view[4]["content"].startswith(messages[4]["content"][:80])
+
+
+def test_notebook_state_is_pinned():
+    context = TokenBudgetContext(budget=1000)
+    context.before_step(SimpleNamespace(notebook=SimpleNamespace(data=[{"date": "2025-05-01"}]), step_n=3))
+    view = context.build([SYSTEM, QUERY] + step(0, observation_chars=20000), CONTROL)
+    assert view[-1] == CONTROL and view[-2]["content"].startswith("当前笔记本状态")
+    assert context.decisions[-1]["step"] == 3 and tokens(view) <= 1000
+
+
+def test_token_counts_are_incremental():
+    context = TokenBudgetContext(budget=100000)
+    messages = history(2)
+    context.build(messages, CONTROL)
+    messages += step(2)
+    context.build(messages, CONTROL)
+    assert context._tokens == [count_tokens(msg['content']) for msg in messages]
+
+
+def test_append_only_compacts_whole_blocks():
+    context = AppendOnlyContext(block_size=2, keep_recent=1, compact_chars=20)
+    messages = history(4)
+    view = context.build(messages, CONTROL)
+    compacted = [idx for idx, msg in enumerate(view) if "已省略" in msg["content"]]
+    assert compacted == [4, 7]
+    assert view[:4] == messages[:4] and view[-1] == CONTROL
+
+
+def test_make_context_rejects_unknown_strategy():
+    assert isinstance(make_context('token_budget', budget=10), TokenBudgetContext)
+    with pytest.raises(ValueError):
+        make_context('unknown')
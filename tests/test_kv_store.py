@@ -0,0 +1,42 @@
+from kv_store import SQLiteKVStore, hash_key
+
+
+def test_set_get_and_stats(tmp_path):
+    with SQLiteKVStore(str(tmp_path / "kv.sqlite")) as store:
+        key = hash_key({"org": "故宫", "dest": "天坛"})
+        assert store.get(key) is None
+        store.set(key, "地铁1号线")
+        assert store.get(key) == "地铁1号线" and key in store and len(store) == 1
+        assert store.stats.as_dict()["hits"] == 1 and store.stats.as_dict()["misses"] == 1
+
+
+def test_max_entries_enforced_after_bulk_writes(tmp_path):
+    with SQLiteKVStore(str(tmp_path / "kv.sqlite"), max_entries=10, evict_every=4) as store:
+        store.set_many([(f"bulk{i}", i) for i in range(7)])  # writes=7，之后的单条写入不会落在 4 的倍数上
+        assert len(store) == 7
+        for i in range(20):
+            store.set(f"key{i}", i)
+            assert len(store) <= 10 + store.evict_every - 1
+        assert store.stats.writes == 27 and store.stats.evictions > 0
+        assert "key19" in store and "bulk0" not in store
+
+
+def test_max_entries_enforced_with_interleaved_writes(tmp_path, monkeypatch):
+    with SQLiteKVStore(str(tmp_path / "kv.sqlite"), max_entries=10, evict_every=4) as store:
+        store.set_many([("bulk", 0)])
+        incr = store.stats.incr
+
+        def incr_with_concurrent_write(name, n=1):
+            # 模拟另一个线程的写入恰好落在本次计数和检查之间，writes 一直是奇数
+            incr(name, n + 1 if name == 'writes' else n)
+
+        monkeypatch.setattr(store.stats, "incr", incr_with_concurrent_write)
+        for i in range(40):
+            store.set(f"key{i}", i)
+        assert len(store) <= 10 + store.evict_every - 1
+
+
+def test_set_many_evicts(tmp_path):
+    with SQLiteKVStore(str(tmp_path / "kv.sqlite"), max_entries=5) as store:
+        assert store.set_many([(f"k{i}", i) for i in range(12)]) == 12
+        assert len(store) == 5
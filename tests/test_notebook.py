@@ -0,0 +1,110 @@
+import pytest
+
+from conftest import CITY_EN
+from travel_agent import Notebook
+
+DATES = ["2025-05-01", "2025-05-02"]
+
+
+def make_notebook(validate, budget=None):
+    notebook = Notebook(CITY_EN if validate else None, validate=validate)
+    notebook.init({"dates": DATES, "num_people": 2})
+    notebook.budget = budget
+    return notebook
+
+
+def attraction(date, *items):
+    return {"info_class": "attraction", "date": date, "data": [{"name": n, "cost": c} for n, c in items]}
+
+
+def meal(date, typ, name, keytag, cost):
+    return {"info_class": typ, "date": date, "data": {"name": name, "keytag": keytag, "cost": cost}}
+
+
+def hotel(date, name, keytag, cost):
+    return {"info_class": "accommodation", "date": date, "data": {"name": name, "keytag": keytag, "cost": cost}}
+
+
+def transit(date, cost):
+    return {"info_class": "transportation", "date": date, "data": {"故宫-天坛": "地铁", "cost": cost}}
+
+
+WRITES = [
+    attraction(DATES[0], ("故宫", 60), ("景山公园", "N/A")),
+    meal(DATES[0], "lunch", "四季民福", "北京菜", 120),
+    hotel(DATES[0], "北京饭店", "高档型", 800),
+    transit(DATES[0], 3),
+    transit(DATES[0], "3"),
+    attraction(DATES[1], ("天坛", 15)),
+    meal(DATES[1], "dinner", "便宜坊", "北京菜", 90),
+]
+
+
+def test_write_without_validation(in_database_dir):
+    notebook = make_notebook(validate=False)
+    for info in WRITES + [attraction(DATES[1], ("故宫", 60)), meal(DATES[1], "breakfast", "不存在的餐厅", "小吃", "免费")]:
+        assert notebook.write(info) == "信息写入成功！"
+    assert notebook.data[0]["visit_attractions"] == ["故宫", "景山公园"]
+    assert notebook.data[0]["cost_per_capita"]["transit"] == 6.
+    assert notebook.data[1]["visit_attractions"] == ["天坛", "故宫"]
+    assert notebook.data[1]["breakfast"] == {"name": "不存在的餐厅", "cuisines": "小吃"}
+    assert notebook.violations == []
+
+
+def test_write_with_validation_matches_unvalidated_data(in_database_dir):
+    plain, validated = make_notebook(validate=False), make_notebook(validate=True, budget=5000)
+    for info in WRITES:
+        plain.write(info)
+        assert validated.write(info).startswith("信息写入成功！当前累计花费")
+    assert validated.data == plain.data
+    assert validated.day_costs == [(60 + 120 + 800 + 6) * 2, (15 + 90) * 2]
+    assert validated.total_cost == sum(validated.day_costs)
+    assert validated.violations == []
+
+
+@pytest.mark.parametrize("info, error", [
+    (attraction(DATES[1], ("长城", 40)), "景点“长城”不在景点数据中"),
+    (attraction(DATES[1], ("故宫", 60)), "景点“故宫”已安排在 2025-05-01"),
+    (attraction(DATES[1], ("天坛", 15), ("天坛", 15)), "景点“天坛”已安排在 2025-05-02"),
+    (meal(DATES[1], "lunch", "不存在的餐厅", "小吃", 20), "餐厅“不存在的餐厅”不在餐厅数据中"),
+    (meal(DATES[1], "lunch", "四季民福", "北京菜", 120), "餐厅“四季民福”已安排在 2025-05-01 的 lunch"),
+    (hotel(DATES[1], "不存在的酒店", "经济型", 100), "酒店“不存在的酒店”不在酒店数据中"),
+    (meal(DATES[1], "breakfast", "吉野家", "快餐厅", "免费"), "cost 必须是数字"),
+])
+def test_validation_rejects(in_database_dir, info, error):
+    notebook = make_notebook(validate=True)
+    for write in WRITES[:3]:
+        notebook.write(write)
+    data_before = str(notebook.data)
+    result = notebook.write(info)
+    assert result.startswith("写入失败：" + error)
+    assert str(notebook.data) == data_before
+    assert notebook.violations[-1]["info_class"] == info["info_class"]
+
+
+def test_rewriting_the_same_meal_is_allowed(in_database_dir):
+    notebook = make_notebook(validate=True)
+    assert notebook.write(meal(DATES[0], "lunch", "四季民福", "北京菜", 120)).startswith("信息写入成功！")
+    assert notebook.write(meal(DATES[0], "lunch", "四季民福", "北京菜", 120)).startswith("信息写入成功！")
+    assert notebook.write(meal(DATES[0], "lunch", "吉野家", "快餐厅", 35)).startswith("信息写入成功！")
+    assert notebook.write(meal(DATES[1], "lunch", "四季民福", "北京菜", 120)).startswith("信息写入成功！")
+
+
+def test_over_budget_is_a_warning(in_database_dir):
+    notebook = make_notebook(validate=True, budget=1000)
+    assert "注意" not in notebook.write(attraction(DATES[0], ("故宫", 60)))
+    result = notebook.write(hotel(DATES[0], "北京饭店", "高档型", 800))
+    assert result.startswith("信息写入成功！")
+    assert "超出预算 1000 元" in result
+    assert notebook.data[0]["accommodation"] == {"name": "北京饭店", "type": "高档型"}
+    assert notebook.total_cost == (60 + 800) * 2
+    assert "warning" in notebook.violations[-1]
+    # 换成更便宜的酒店后不再提示
+    assert "注意" not in notebook.write(hotel(DATES[0], "如家", "经济型", 200))
+
+
+def test_init_required(in_database_dir):
+    notebook = Notebook(CITY_EN, validate=True)
+    assert notebook.write(WRITES[0]).startswith("写入失败")
+    notebook.init({"dates": DATES, "num_people": 2})
+    assert notebook.write(attraction("2025-06-01", ("故宫", 60))) == "写入失败：在笔记本中找不到日期 2025-06-01 。"
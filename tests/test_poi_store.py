@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import CITY_EN, write_city
+from poi_store import CityPOIStore, preference_key
+from snapshot import build_snapshot, build_table_snapshot, snapshot_dir, snapshot_exists
+
+
+def lookups(store):
+    result = {"attractions": store.attractions()}
+    for attraction in ["故宫", "天坛", "颐和园", "不存在"]:
+        for categories in [None, ["中餐"], ["小吃快餐", "外国菜"], ["炸酱面"]]:
+            result[("restaurant", attraction, str(categories))] = store.nearby_restaurants(attraction, categories)
+        for types in [None, ["经济型"], ["高档型", "舒适型"]]:
+            result[("hotel", attraction, str(types))] = store.nearby_hotels(attraction, types)
+    for table in ["attraction", "restaurant", "hotel"]:
+        result[("names", table)] = sorted(store.names(table))
+        result[("contains", table)] = [n in store.names(table) for n in ["故宫", "四季民福", "如家", "不存在"]]
+    result["locations"] = [store.location(n) for n in ["故宫", "四季民福", "如家", "不存在"]]
+    return result
+
+
+def test_snapshot_matches_csv(database_dir):
+    expected = lookups(CityPOIStore(CITY_EN, database_dir))
+    build_snapshot(CITY_EN, database_dir)
+    assert all(snapshot_exists(CITY_EN, t, database_dir) for t in ["attraction", "restaurant", "hotel"])
+    store = CityPOIStore(CITY_EN, database_dir)
+    assert lookups(store) == expected
+    kind, (codes, values) = store._table("restaurant").column("attraction")
+    assert kind == "dict" and isinstance(codes, np.memmap) and isinstance(values, np.memmap)
+
+
+def test_nearby_records(database_dir):
+    store = CityPOIStore(CITY_EN, database_dir)
+    assert store.nearby_restaurants("天坛") == [
+        {"name": "便宜坊", "cost": 90., "keytag": "北京菜"},
+        {"name": "炸酱面馆", "cost": "N/A", "keytag": "N/A"},
+    ]
+    assert [r["name"] for r in store.nearby_restaurants("故宫", ["外国菜", "轻食"])] == ["寿司郎", "沙拉工坊"]
+    assert store.nearby_hotels("不存在") == []
+
+
+@pytest.mark.parametrize("rebuild", [False, True])
+def test_build_table_snapshot_replaces_directory(database_dir, rebuild):
+    build_table_snapshot(CITY_EN, "hotel", database_dir)
+    if rebuild:
+        write_city(database_dir)
+        build_table_snapshot(CITY_EN, "hotel", database_dir)
+    parent = os.path.dirname(snapshot_dir(CITY_EN, "hotel", database_dir))
+    assert [d for d in os.listdir(parent) if "tmp" in d or "old" in d] == []
+    assert sorted(CityPOIStore(CITY_EN, database_dir).names("hotel")) == sorted(["北京饭店", "如家", "天坛饭店"])
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_postings_match_linear_filter(database_dir, snapshot):
+    if snapshot:
+        build_snapshot(CITY_EN, database_dir)
+    store = CityPOIStore(CITY_EN, database_dir)
+    for table, nearby, keys in [("restaurant", store.nearby_restaurants, ["中餐", "小吃快餐", "外国菜", "轻食", "N/A"]),
+                                ("hotel", store.nearby_hotels, ["经济型", "舒适型", "高档型"])]:
+        for attraction in ["故宫", "天坛", "颐和园", "景山公园", "不存在"]:
+            records = nearby(attraction)
+            for n in range(len(keys) + 1):
+                selected = keys[:n] + ["不存在的键"]
+                expected = [r for r in records if preference_key(table, r["keytag"]) in selected]
+                assert nearby(attraction, selected) == expected
+    assert store.nearby_restaurants("天坛", ["N/A"]) == [{"name": "炸酱面馆", "cost": "N/A", "keytag": "N/A"}]
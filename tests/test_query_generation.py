@@ -0,0 +1,146 @@
+import json
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import query_generation as qg
+from llm_api import LLMCaller, ResponseCache
+
+FIELDS = {"days": 2, "people_number": 3, "date": "2025-05-01",
+          "preference_constraint": {"budget": 6000, "cuisines": ["中餐", "轻食"], "hotel": "舒适型"}, "level": "Hard"}
+GOOD_QUERY = "我们三个人想在2025-05-01出发去北京玩两天，预算6000元，喜欢中餐和轻食，希望住舒适型酒店。"
+
+
+class FakeLLM:
+    """按顺序返回预先给定的回复，并记录收到的请求。"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get_response(self, messages, tools, **kwargs):
+        self.requests.append(messages)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("text", [
+    GOOD_QUERY,
+    "2025-05-01开始，3人，2天，预算 6,000 元，中餐、轻食，舒适型。",
+    "三位朋友 2 日游，2025-05-01 出发，预算6000，爱吃中餐和轻食，住舒适型。",
+])
+def test_validate_query_accepts(text):
+    assert qg.validate_query(text, FIELDS) is None
+
+
+@pytest.mark.parametrize("text, error", [
+    (None, "query 为空"),
+    ("   ", "query 为空"),
+    (GOOD_QUERY.replace("两天", "几天"), "缺少天数"),
+    (GOOD_QUERY.replace("三个人", "一家人"), "缺少人数"),
+    (GOOD_QUERY.replace("2025-05-01", "五一"), "缺少日期"),
+    (GOOD_QUERY.replace("6000", "5000"), "缺少预算"),
+    (GOOD_QUERY.replace("舒适型", "高档型"), "缺少住宿偏好"),
+    (GOOD_QUERY.replace("轻食", "烧烤"), "缺少饮食偏好 轻食"),
+])
+def test_validate_query_rejects(text, error):
+    assert qg.validate_query(text, FIELDS) == error
+
+
+def test_validate_query_budget_only():
+    fields = {"days": 1, "people_number": 1, "date": "2025-05-01", "preference_constraint": {"budget": 800}}
+    assert qg.validate_query("一个人2025-05-01去北京一日游，预算800元", fields) is None
+
+
+def test_batch_accepts_string_ids_and_retries_failed_records():
+    other = dict(FIELDS, people_number=1, date="2025-06-01")
+    other_query = GOOD_QUERY.replace("三个人", "1人").replace("2025-05-01", "2025-06-01")
+    llm = FakeLLM([
+        {"queries": [{"id": "0", "query": GOOD_QUERY}, {"id": " 1 ", "query": "缺少约束"}, {"id": "x", "query": "?"}]},
+        {"queries": [{"id": 0, "query": other_query}]},
+    ])
+    results = qg.generate_travel_queries_batch("北京", llm, [FIELDS, other], max_retries=2)
+    assert [r["query"] for r in results] == [GOOD_QUERY, other_query]
+    assert results[0]["level"] == "Hard" and list(results[0])[-1] == "level"
+    assert len(llm.requests) == 2
+    assert "[1]" not in llm.requests[1][1]["content"]  # 重试时只重新打包未通过校验的记录
+
+
+def test_batch_gives_up_after_max_retries():
+    llm = FakeLLM(["not json", {"queries": [{"id": 0, "query": "缺少约束"}]}])
+    assert qg.generate_travel_queries_batch("北京", llm, [FIELDS], max_retries=1) == [None]
+
+
+def test_single_query_is_validated_and_retried():
+    rng = random.Random(0)
+    _, fields = qg.build_query_spec("北京", 2, 2, "Hard", random.Random(0), datetime(2025, 5, 1))
+    preference = fields["preference_constraint"]
+    good = (f"{fields['people_number']}人{fields['days']}天，{fields['date']}出发，预算{preference['budget']}元，"
+            f"{'、'.join(preference['cuisines'])}，{preference['hotel']}")
+    llm = FakeLLM([{"query": "随便玩玩", "days": 9}, {"query": good, "days": 9}])
+    result = qg.generate_travel_query("北京", llm, 2, 2, "Hard", rng, datetime(2025, 5, 1), max_retries=1)
+    assert result["query"] == good
+    assert result["days"] == 2  # 结构化字段以 Python 中确定的为准
+    assert len(llm.requests) == 2
+
+    llm = FakeLLM([{"query": "随便玩玩"}, {"query": "还是随便"}])
+    assert qg.generate_travel_query("北京", llm, 2, 2, "Hard", random.Random(0), datetime(2025, 5, 1),
+                                    max_retries=1) is None
+
+
+def test_build_query_spec_is_seeded():
+    specs = [qg.build_query_spec("北京", 3, 2, "Hard", qg.item_rng(7, "beijing", "Hard-0"), datetime(2025, 5, 1))
+             for _ in range(2)]
+    assert specs[0] == specs[1]
+    assert "2025-05-01" <= specs[0][1]["date"] <= "2025-07-30"
+
+
+def test_resolve_header():
+    header, is_new = qg.resolve_header(None, None, "2025-05-01")
+    assert (header, is_new) == ({"seed": 0, "start_date": "2025-05-01"}, True)
+    assert qg.resolve_header(header, None, None) == (header, False)
+    assert qg.resolve_header(header, 0, "2025-05-01") == (header, False)
+    with pytest.raises(ValueError):
+        qg.resolve_header(header, 1, None)
+
+
+class FakeCompletions:
+    """替换 OpenAI 客户端的 chat.completions，按顺序返回给定的 JSON 内容。"""
+
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        content = json.dumps(self.contents.pop(0), ensure_ascii=False)
+        message = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, logprobs=None)], usage=None)
+
+
+def cached_llm(tmp_path, monkeypatch, contents):
+    monkeypatch.setenv("OpenAI_API_KEY", "test")
+    llm = LLMCaller("OpenAI", "gpt-4o-mini", cache=ResponseCache(path=str(tmp_path / "cache.sqlite"), cache_sampling=True))
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(contents)))
+    return llm
+
+
+def test_retries_are_not_served_the_cached_bad_reply(tmp_path, monkeypatch):
+    llm = cached_llm(tmp_path, monkeypatch, [{"queries": [{"id": 0, "query": "缺少约束"}]},
+                                             {"queries": [{"id": 0, "query": GOOD_QUERY}]}])
+    assert qg.generate_travel_queries_batch("北京", llm, [FIELDS], max_retries=2)[0]["query"] == GOOD_QUERY
+    assert llm.client.chat.completions.calls == 2 and llm.usage["cache_hits"] == 0
+    # 续跑时直接命中通过校验的回复
+    assert qg.generate_travel_queries_batch("北京", llm, [FIELDS], max_retries=2)[0]["query"] == GOOD_QUERY
+    assert llm.client.chat.completions.calls == 2 and llm.usage["cache_hits"] == 1
+
+    _, fields = qg.build_query_spec("北京", 1, 0, "Easy", random.Random(0), datetime(2025, 5, 1))
+    good = f"{fields['people_number']}人{fields['days']}天，{fields['date']}出发，预算{fields['preference_constraint']['budget']}元"
+    llm = cached_llm(tmp_path / "single", monkeypatch, [{"query": "随便玩玩"}, {"query": good}])
+    result = qg.generate_travel_query("北京", llm, 1, 0, "Easy", random.Random(0), datetime(2025, 5, 1), max_retries=2)
+    assert result["query"] == good
+    assert llm.client.chat.completions.calls == 2 and llm.usage["cache_hits"] == 0
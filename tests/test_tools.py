@@ -0,0 +1,71 @@
+import pytest
+
+import tools
+from tools import query_records
+
+RECORDS = [
+    {"name": "四季民福", "cost": 120., "keytag": "北京菜"},
+    {"name": "炸酱面馆", "cost": "N/A", "keytag": "N/A"},
+    {"name": "吉野家", "cost": 35., "keytag": "快餐厅"},
+    {"name": "寿司郎", "cost": 80., "keytag": "寿司"},
+    {"name": "沙拉工坊", "cost": 45., "keytag": "沙拉"},
+]
+
+
+def names(records):
+    return [r["name"] for r in records]
+
+
+def test_no_options_returns_records_unchanged():
+    assert query_records(RECORDS, {"city_name": "北京"}) == (RECORDS, "")
+    records, note = query_records(RECORDS, {"city_name": "北京"}, default_limit=2)
+    assert (records, note) == (RECORDS[:2], "")
+
+
+def test_cost_range_keeps_unknown_costs():
+    records, note = query_records(RECORDS, {"min_cost": 40, "max_cost": "100"})
+    assert names(records) == ["炸酱面馆", "寿司郎", "沙拉工坊"]
+    assert note == "（符合条件的共3条，本次返回第1-3条）"
+
+
+@pytest.mark.parametrize("sort_by, expected", [
+    ("cost", ["吉野家", "沙拉工坊", "寿司郎", "四季民福", "炸酱面馆"]),
+    ("cost_desc", ["四季民福", "寿司郎", "沙拉工坊", "吉野家", "炸酱面馆"]),
+    ("name", names(RECORDS)),
+])
+def test_sort_puts_unknown_costs_last(sort_by, expected):
+    records, _ = query_records(RECORDS, {"sort_by": sort_by})
+    assert names(records) == expected
+
+
+def test_paging():
+    records, note = query_records(RECORDS, {"sort_by": "cost", "offset": 1, "limit": 2})
+    assert names(records) == ["沙拉工坊", "寿司郎"]
+    assert note == "（符合条件的共5条，本次返回第2-3条）"
+    records, note = query_records(RECORDS, {"offset": 10})
+    assert records == [] and note == "（符合条件的共5条，本页没有结果）"
+    records, _ = query_records(RECORDS, {"offset": -3, "limit": 1})
+    assert names(records) == ["四季民福"]
+
+
+def test_default_limit_applies_unless_limit_given():
+    records, _ = query_records(RECORDS, {"sort_by": "cost"}, default_limit=2)
+    assert names(records) == ["吉野家", "沙拉工坊"]
+    records, _ = query_records(RECORDS, {"sort_by": "cost", "limit": 4}, default_limit=2)
+    assert len(records) == 4
+
+
+def test_exclude_names():
+    records, note = query_records(RECORDS, {"exclude_names": ["四季民福", "不存在"], "max_cost": 50})
+    assert names(records) == ["炸酱面馆", "吉野家", "沙拉工坊"]
+    assert note.startswith("（符合条件的共3条")
+
+
+def test_restaurant_tool_filters_by_category(in_database_dir):
+    result = tools.search_nearby_restaurant_cache(
+        {"city_name": "北京", "attraction": "故宫", "cuisine_category": "中餐", "sort_by": "cost"})
+    assert "四季民福" in result and "吉野家" not in result
+    result = tools.search_nearby_restaurant_cache(
+        {"city_name": "北京市", "attraction": "故宫", "sort_by": "cost", "limit": 2})
+    assert result.index("吉野家") < result.index("沙拉工坊") and "四季民福" not in result
+    assert result.endswith("（符合条件的共4条，本次返回第1-2条）")
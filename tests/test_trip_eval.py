@@ -0,0 +1,210 @@
+import ast
+import copy
+import os
+
+import pandas as pd
+import pytest
+
+from config import CUISINE_MAP
+import trip_eval
+from conftest import CITY_EN
+
+
+def baseline_check(query_data, plan, base_dir, city_en=CITY_EN):
+    """基线 trip_eval 的校验逻辑：每次检查都从 CSV 读取名称、列表查重、逐类扫描菜系。"""
+    def names(table):
+        return pd.read_csv(os.path.join(base_dir, city_en, 'amap', f'{table}_cache.csv'))['name'].values
+
+    def valid_attractions():
+        all_attractions = names('attraction')
+        for day_plan in plan:
+            for attract in day_plan.get('visit_attractions') or []:
+                if attract not in all_attractions:
+                    return False, "Invalid Attraction"
+        return True, None
+
+    def valid_restaurants():
+        all_restaurants = names('restaurant')
+        for day_plan in plan:
+            for diet in ['breakfast', 'lunch', 'dinner']:
+                if isinstance(day_plan.get(diet), dict) and day_plan[diet].get('name') not in all_restaurants:
+                    return False, "Invalid Restaurant"
+        return True, None
+
+    def valid_accommodations():
+        all_accommodations = names('hotel')
+        for day, day_plan in enumerate(plan):
+            accommodation = day_plan.get("accommodation")
+            if not isinstance(accommodation, dict) or not accommodation:
+                return False, f"Accommodation Missing on Day {day + 1}"
+            if accommodation.get("name") not in all_accommodations:
+                return False, f"Invalid Accommodation '{accommodation.get('name')}' on Day {day + 1}"
+        return True, None
+
+    def no_repeated_attractions():
+        observed = []
+        for day_plan in plan:
+            for attract in day_plan.get('visit_attractions') or []:
+                if attract in observed:
+                    return False, "Attraction is Repeated"
+                observed.append(attract)
+        return True, None
+
+    def budget():
+        pre_budget = eval(query_data['preference_constraint'])['budget']
+        total_cost = sum(sum(float(x) if x != 'N/A' else 0 for x in d['cost_per_capita'].values()) * d['num_people']
+                         for d in plan)
+        return (True, None) if total_cost <= pre_budget else (False, "Overspend Budget")
+
+    def favorite_cuisine():
+        pre_cuisines = ast.literal_eval(query_data['preference_constraint']).get('cuisines')
+        if not pre_cuisines:
+            return True, None
+        for day_plan in plan:
+            for diet in ['breakfast', 'lunch', 'dinner']:
+                cuisine = (day_plan.get(diet) or {}).get('cuisines', '')
+                if not cuisine:
+                    continue
+                category = next((c for c, tags in CUISINE_MAP.items() if cuisine in tags), None)
+                if (category or cuisine) not in pre_cuisines:
+                    return False, "Unsatisfied Cuisines"
+        return True, None
+
+    def preferred_hotel_type():
+        pre_types = eval(query_data['preference_constraint']).get('hotel')
+        if pre_types:
+            for day, day_plan in enumerate(plan):
+                accommodation = day_plan.get('accommodation')
+                if not isinstance(accommodation, dict) or not accommodation:
+                    return False, f"Missing Accommodation Info on Day {day + 1}"
+                if accommodation.get('type', '') not in pre_types:
+                    return False, f"Unsatisfied Hotel Type on Day {day + 1}"
+        return True, None
+
+    return {
+        'commonsense': {
+            "is_valid_fields": trip_eval.is_valid_fields(plan),
+            "is_valid_days": trip_eval.is_valid_days(query_data, plan),
+            "is_valid_attractions": valid_attractions(),
+            "is_valid_restaurants": valid_restaurants(),
+            "is_valid_accommodations": valid_accommodations(),
+            "is_no_repeated_attractions": no_repeated_attractions(),
+            "is_no_repeated_restaurants": trip_eval.is_no_repeated_restaurants(plan),
+        },
+        'preference': {
+            "is_reasonable_budget": budget(),
+            "is_favorite_cuisine": favorite_cuisine(),
+            "is_preferred_hotel_type": preferred_hotel_type(),
+        },
+    }
+
+
+def day(date, attractions, meals, hotel, costs, num_people=2):
+    return {
+        "date": date,
+        "num_people": num_people,
+        "visit_attractions": attractions,
+        **{meal: {"name": name, "cuisines": cuisine} for meal, (name, cuisine) in zip(['breakfast', 'lunch', 'dinner'], meals)},
+        "accommodation": {"name": hotel[0], "type": hotel[1]},
+        "transportation": {"故宫-天坛": "地铁"},
+        "cost_per_capita": costs,
+    }
+
+
+GOOD_PLAN = [
+    day("2025-05-01", ["故宫", "景山公园"], [("吉野家", "快餐厅"), ("四季民福", "北京菜"), ("沙拉工坊", "沙拉")],
+        ("北京饭店", "高档型"), {"故宫": 60, "景山公园": "N/A", "breakfast": 35, "lunch": 120, "dinner": 45,
+                             "accommodation": 800, "transit": 6.}),
+    day("2025-05-02", ["天坛"], [("炸酱面馆", "小吃"), ("便宜坊", "北京菜"), ("寿司郎", "寿司")],
+        ("天坛饭店", "舒适型"), {"天坛": 15, "breakfast": "N/A", "lunch": 90, "dinner": 80, "accommodation": 500}),
+]
+
+
+def perturbations():
+    plans = {"good": GOOD_PLAN}
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[1]["visit_attractions"] = ["故宫"]
+    plans["repeated_attraction"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[1]["visit_attractions"] = ["长城"]
+    plans["unknown_attraction"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[1]["lunch"] = {"name": "四季民福", "cuisines": "北京菜"}
+    plans["repeated_restaurant"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[0]["dinner"] = {"name": "不存在的餐厅", "cuisines": "川菜"}
+    plans["unknown_restaurant"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[1]["accommodation"] = {"name": "不存在的酒店", "type": "经济型"}
+    plans["unknown_hotel"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[1]["accommodation"] = {}
+    plans["missing_hotel"] = plan
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[0]["cost_per_capita"]["accommodation"] = 5000
+    plans["over_budget"] = plan
+    plans["one_day"] = copy.deepcopy(GOOD_PLAN[:1])
+    plan = copy.deepcopy(GOOD_PLAN)
+    plan[0]["transportation"] = {}
+    plans["missing_field"] = plan
+    return plans
+
+
+QUERIES = {
+    "budget_only": {"days": 2, "people_number": 2, "preference_constraint": "{'budget': 4000}"},
+    "cuisine": {"days": 2, "people_number": 2, "preference_constraint": "{'budget': 4000, 'cuisines': ['中餐', '小吃快餐']}"},
+    "cuisine_all": {"days": 2, "people_number": 2,
+                    "preference_constraint": "{'budget': 4000, 'cuisines': ['中餐', '小吃快餐', '轻食', '外国菜']}"},
+    "hotel": {"days": 2, "people_number": 2, "preference_constraint": "{'budget': 4000, 'hotel': '舒适型'}"},
+    "tight_budget": {"days": 2, "people_number": 2, "preference_constraint": "{'budget': 1000}"},
+}
+
+
+@pytest.mark.parametrize("query_name", list(QUERIES))
+@pytest.mark.parametrize("plan_name", list(perturbations()))
+def test_validator_matches_baseline(database_dir, query_name, plan_name):
+    query_data, plan = QUERIES[query_name], perturbations()[plan_name]
+    validator = trip_eval.TripValidator(CITY_EN, database_dir)
+    assert validator.check(query_data, plan) == baseline_check(query_data, plan, database_dir)
+
+
+def test_validator_reports_expected_failures(database_dir):
+    validator = trip_eval.TripValidator(CITY_EN, database_dir)
+    plans = perturbations()
+    good = validator.check(QUERIES["cuisine_all"], plans["good"])
+    assert all(v[0] for v in good["commonsense"].values())
+    assert all(v[0] for v in good["preference"].values())
+    assert validator.check(QUERIES["budget_only"], plans["unknown_attraction"])["commonsense"]["is_valid_attractions"] \
+        == (False, "Invalid Attraction")
+    assert validator.check(QUERIES["budget_only"], plans["over_budget"])["preference"]["is_reasonable_budget"] \
+        == (False, "Overspend Budget")
+    assert validator.check(QUERIES["cuisine"], plans["good"])["preference"]["is_favorite_cuisine"] \
+        == (False, "Unsatisfied Cuisines")
+
+
+def test_check_batch_matches_check(database_dir):
+    validator = trip_eval.TripValidator(CITY_EN, database_dir)
+    plans = list(perturbations().values()) + [[]]
+    queries = [QUERIES["hotel"]] * len(plans)
+    assert validator.check_batch(queries, plans) == [validator.check(q, p) for q, p in zip(queries, plans)]
+    assert validator.check_batch(queries, plans)[-1] == {'commonsense': None, 'preference': None}
+
+
+@pytest.mark.parametrize("constraint", [float('nan'), "{'budget': 4000", "not a dict", None])
+def test_malformed_preference_is_a_failed_check(database_dir, constraint):
+    validator = trip_eval.TripValidator(CITY_EN, database_dir)
+    queries = [QUERIES["budget_only"], {"days": 2, "people_number": 2, "preference_constraint": constraint}]
+    results = validator.check_batch(queries, [GOOD_PLAN, GOOD_PLAN])
+    assert results[0]["preference"]["is_reasonable_budget"] == (True, None)
+    assert results[1]["preference"] == {
+        "is_reasonable_budget": (False, "Invalid Preference Constraint"),
+        "is_favorite_cuisine": (True, None),
+        "is_preferred_hotel_type": (True, None),
+    }
+
+
+def test_parse_preference():
+    assert trip_eval.parse_preference("{'budget': 3000, 'hotel': '经济型'}") == {'budget': 3000, 'hotel': '经济型'}
+    assert trip_eval.parse_preference({'budget': 3000}) == {'budget': 3000}
+    assert trip_eval.parse_preference("[1, 2]") is None
+    assert trip_eval.parse_preference(float('nan')) is None
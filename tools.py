@@ -1,9 +1,14 @@
-from config import CITY_MAP, ROOT_PATH
-import pandas as pd
+from config import CITY_MAP, ROOT_PATH, TRANSPORT_CACHE_BACKEND, TRANSPORT_CACHE_TTL, TRANSPORT_CACHE_MAX_ENTRIES, TRANSPORT_MODE
+from config import BAIDU_TIMEOUT, BAIDU_POOL_MAXSIZE, CUISINE_MAP, HOTEL_MAP, OBSERVATION_ENCODING
+from poi_store import get_poi_store
+from kv_store import open_store, hash_key
+import transit_estimator
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
-import hashlib
+import math
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -12,41 +17,111 @@ BAIDU_API_KEY=os.environ["BAIDU_API_KEY"]
 CITY_MAP = {value: key for key, value in CITY_MAP.items()}
 
 CACHE_DIR = f"{ROOT_PATH}/database/transport_cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
+if TRANSPORT_CACHE_BACKEND == 'sqlite':
+    transport_cache = open_store('sqlite', f"{ROOT_PATH}/database/transport_cache.sqlite", table='transport',
+                                 ttl=TRANSPORT_CACHE_TTL, max_entries=TRANSPORT_CACHE_MAX_ENTRIES)
+else:
+    transport_cache = open_store('json', CACHE_DIR)
+coordinate_cache = open_store('sqlite', f"{ROOT_PATH}/database/geocode_cache.sqlite", table='geocode')
 
-def get_cache_key(params: dict) -> str:
-    raw = json.dumps(params, ensure_ascii=False, sort_keys=True)
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+def build_baidu_session(pool_maxsize=BAIDU_POOL_MAXSIZE):
+    session = requests.Session()
+    # pool_block=True：每个 host 同时最多 pool_maxsize 个连接，超出的请求排队复用 keep-alive 连接
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-def load_from_cache(cache_key):
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    if os.path.exists(cache_file):
-        with open(cache_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
+baidu_session = build_baidu_session()
+geocode_executor = ThreadPoolExecutor(max_workers=BAIDU_POOL_MAXSIZE)
 
-def save_to_cache(cache_key, result):
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    with open(cache_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+TRANSPORT_MODES = ['live', 'cache-only', 'offline']
+transport_mode = TRANSPORT_MODE
+
+def set_transport_mode(mode):
+    global transport_mode
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"transport mode must be one of {TRANSPORT_MODES}, got {mode}")
+    transport_mode = mode
+
+OBSERVATION_ENCODINGS = ['repr', 'table']
+observation_encoding = OBSERVATION_ENCODING
+
+def set_observation_encoding(encoding):
+    global observation_encoding
+    if encoding not in OBSERVATION_ENCODINGS:
+        raise ValueError(f"observation encoding must be one of {OBSERVATION_ENCODINGS}, got {encoding}")
+    observation_encoding = encoding
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace('\t', ' ').replace('\n', ' ')
+
+def format_records(prefix, records, encoding=None):
+    """repr: 原始的 dict 列表；table: 表头只出现一次的 TSV，列名与 NotebookWrite 的字段一致。"""
+    encoding = encoding or observation_encoding
+    if encoding == 'repr':
+        return prefix + "：" + str(records)
+    if not records:
+        return prefix + "：无"
+    columns = list(records[0])
+    lines = ['\t'.join(columns)] + ['\t'.join(_format_value(r.get(c)) for c in columns) for r in records]
+    return prefix + f"（TSV表格，共{len(records)}行）：\n" + '\n'.join(lines) + '\n'
 
 def normalize_city_name(name):
     if not name.endswith("市"):
         return name + "市"
     return name
 
+QUERY_OPTIONS = ['min_cost', 'max_cost', 'sort_by', 'offset', 'limit', 'exclude_names']
+
+def _cost(record):
+    return record['cost'] if isinstance(record['cost'], (int, float)) else None
+
+def query_records(records, params, default_limit=None):
+    """按 params 中的可选条件过滤、排序、分页；未给出任何条件时与原始返回完全一致。"""
+    if not any(params.get(k) is not None for k in QUERY_OPTIONS):
+        return records[:default_limit] if default_limit else records, ""
+
+    min_cost, max_cost = params.get('min_cost'), params.get('max_cost')
+    exclude_names = set(params.get('exclude_names') or [])
+    selected = []
+    for record in records:
+        cost = _cost(record)
+        if record['name'] in exclude_names:
+            continue
+        if cost is not None and ((min_cost is not None and cost < float(min_cost)) or
+                                 (max_cost is not None and cost > float(max_cost))):
+            continue
+        selected.append(record)
+
+    sort_by = params.get('sort_by')
+    if sort_by in ('cost', 'cost_desc'):
+        known = [r for r in selected if _cost(r) is not None]
+        unknown = [r for r in selected if _cost(r) is None]
+        selected = sorted(known, key=_cost, reverse=sort_by == 'cost_desc') + unknown
+
+    offset = max(int(params.get('offset') or 0), 0)
+    limit = params.get('limit')
+    limit = int(limit) if limit is not None else default_limit
+    page = selected[offset:offset + limit] if limit else selected[offset:]
+    note = f"（符合条件的共{len(selected)}条，本次返回第{offset + 1}-{offset + len(page)}条）" if page else \
+        f"（符合条件的共{len(selected)}条，本页没有结果）"
+    return page, note
+
+def _as_list(value):
+    if value is None or value == "" or value == []:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
 def search_attraction_cache(params):
     if type(params) == str:
         params = eval(params)
     city_zh = normalize_city_name(params['city_name'])
     city_en = CITY_MAP[city_zh]
-    df = pd.read_csv(f'database/{city_en}/amap/attraction_cache.csv', index_col=None)
-    df['cost'] = df['cost'].astype(float)
-    df = df.fillna(0)
-    df = df[['name', 'cost']]
-    # df = df.iloc[:30]
-    df = df.to_dict(orient='records')
-    return "工具返回的景点信息是：" + str(df)
+    records, note = query_records(get_poi_store(city_en).attractions(), params)
+    return format_records("工具返回的景点信息是", records) + note
 
 def search_nearby_restaurant_cache(params):
     if type(params) == str:
@@ -54,14 +129,9 @@ def search_nearby_restaurant_cache(params):
     attraction = params['attraction']
     city_zh = normalize_city_name(params['city_name'])
     city_en = CITY_MAP[city_zh]
-    df = pd.read_csv(f'database/{city_en}/amap/restaurant_cache.csv', index_col=None)
-    df = df[df['attraction'] == attraction]
-    df['cost'] = df['cost'].astype(float)
-    df = df.fillna('N/A')
-    df = df[['name', 'cost', 'keytag']]
-    df = df.iloc[:30]
-    df = df.to_dict(orient='records')
-    return "工具返回的餐厅信息是：" + str(df)
+    records = get_poi_store(city_en).nearby_restaurants(attraction, _as_list(params.get('cuisine_category')))
+    records, note = query_records(records, params, default_limit=30)
+    return format_records("工具返回的餐厅信息是", records) + note
 
 def search_nearby_hotel_cache(params):
     if type(params) == str:
@@ -69,44 +139,85 @@ def search_nearby_hotel_cache(params):
     attraction = params['attraction']
     city_zh = normalize_city_name(params['city_name'])
     city_en = CITY_MAP[city_zh]
-    df = pd.read_csv(f'database/{city_en}/amap/hotel_cache.csv', index_col=None)
-    df = df[df['attraction'] == attraction]
-    df['cost'] = df['cost'].astype(float)
-    df = df.fillna('N/A')
-    df = df[['name', 'cost', 'keytag']]
-    df = df.iloc[:30]
-    df = df.to_dict(orient='records')
-    return "工具返回的住宿信息是：" + str(df)
+    records = get_poi_store(city_en).nearby_hotels(attraction, _as_list(params.get('hotel_type')))
+    records, note = query_records(records, params, default_limit=30)
+    return format_records("工具返回的住宿信息是", records) + note
 
 def search_baidu_transport(params):
     if isinstance(params, str):
         params = json.loads(params)
+    if transport_mode == 'offline':
+        return estimate_transport([params])[0]
 
-    cache_key = get_cache_key(params)
-    cache_result = load_from_cache(cache_key)
+    cache_key = hash_key(params)
+    cache_result = transport_cache.get(cache_key)
     if cache_result:
         return cache_result
 
     org = params['org']
     dest = params['dest']
+    if transport_mode == 'cache-only':
+        return f"缓存中没有{org}到{dest}的交通信息。"
     city_zh = normalize_city_name(params['city_name'])
     url = "https://api.map.baidu.com/direction/v2/transit"
+    org_future = geocode_executor.submit(get_baidu_coordinates, org, city_zh)
+    dest_coordinates = get_baidu_coordinates(dest, city_zh)
     params = {
-        "origin": get_baidu_coordinates(org, city_zh),
-        "destination": get_baidu_coordinates(dest, city_zh),
+        "origin": org_future.result(),
+        "destination": dest_coordinates,
         "page_size": 1,
         "page_index": 1,
         "ak": BAIDU_API_KEY,
     }
-    response = requests.get(url=url, params=params)
+    response = baidu_session.get(url=url, params=params, timeout=BAIDU_TIMEOUT)
     if response.status_code == 200:
         parsed = parse_baidu_transport_info(org, dest, response.json())
-        save_to_cache(cache_key, parsed)
+        transport_cache.set(cache_key, parsed)
         return parsed
     else:
         return f"API请求失败，状态码: {response.status_code}, 错误信息: {response.text}"
 
+def search_baidu_transport_batch(params_list, max_workers=8):
+    """并发查询一组 {'org', 'dest', 'city_name'}，结果与输入顺序一致。"""
+    if transport_mode == 'offline':
+        return estimate_transport([json.loads(p) if isinstance(p, str) else p for p in params_list])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(search_baidu_transport, params_list))
+
+def gcj02_to_bd09(lng, lat):
+    x_pi = math.pi * 3000.0 / 180.0
+    z = math.sqrt(lng * lng + lat * lat) + 0.00002 * math.sin(lat * x_pi)
+    theta = math.atan2(lat, lng) + 0.000003 * math.cos(lng * x_pi)
+    return z * math.cos(theta) + 0.0065, z * math.sin(theta) + 0.006
+
+def poi_coordinates(address, city):
+    city_en = CITY_MAP.get(normalize_city_name(city))
+    if not city_en:
+        return None
+    try:
+        location = get_poi_store(city_en).location(address)
+    except FileNotFoundError:
+        return None
+    if not location:
+        return None
+    lng, lat = gcj02_to_bd09(*map(float, location.split(',')))
+    return f"{lat:.6f}" + "," + f"{lng:.6f}"
+
+def lookup_coordinates(address, city):
+    cache_key = hash_key([normalize_city_name(city), address])
+    coordinates = coordinate_cache.get(cache_key)
+    if coordinates:
+        return coordinates
+    coordinates = poi_coordinates(address, city)
+    if coordinates:
+        coordinate_cache.set(cache_key, coordinates)
+    return coordinates
+
 def get_baidu_coordinates(address, city='北京市'):
+    coordinates = lookup_coordinates(address, city)
+    if coordinates:
+        return coordinates
+
     url = "https://api.map.baidu.com/geocoding/v3"
     params = {
         "address": address,
@@ -114,12 +225,14 @@ def get_baidu_coordinates(address, city='北京市'):
         "city": city,
         "ak": BAIDU_API_KEY,
     }
-    response = requests.get(url=url, params=params)
+    response = baidu_session.get(url=url, params=params, timeout=BAIDU_TIMEOUT)
     if response.status_code == 200:
         loc = response.json().get('result').get('location')
         lng = loc.get('lng')
         lat = loc.get('lat')
-        return f"{lat:.6f}" + "," + f"{lng:.6f}"
+        coordinates = f"{lat:.6f}" + "," + f"{lng:.6f}"
+        coordinate_cache.set(hash_key([normalize_city_name(city), address]), coordinates)
+        return coordinates
     else:
         return f"API请求失败，状态码: {response.status_code}, 错误信息: {response.text}"
 
@@ -137,6 +250,31 @@ def parse_baidu_transport_info(origin, dest, response):
     parsed_info = f"查询到{origin}到{dest}的交通信息\n" + '\n'.join(parsed_info)
     return parsed_info
 
+def estimate_transport(params_list):
+    """离线估计一组 {'org', 'dest', 'city_name'} 的交通信息，同一城市的 OD 对一次向量化计算，不访问网络。"""
+    results = [None] * len(params_list)
+    by_city = {}
+    for i, params in enumerate(params_list):
+        city_zh = normalize_city_name(params['city_name'])
+        if city_zh not in CITY_MAP:
+            results[i] = f"离线模式不支持城市{city_zh}。"
+            continue
+        org_coords = lookup_coordinates(params['org'], city_zh)
+        dest_coords = lookup_coordinates(params['dest'], city_zh)
+        if not org_coords or not dest_coords:
+            missing = params['org'] if not org_coords else params['dest']
+            results[i] = f"离线模式下无法获取{missing}的坐标，无法估计交通信息。"
+            continue
+        by_city.setdefault(CITY_MAP[city_zh], []).append((i, org_coords, dest_coords))
+
+    for city_en, items in by_city.items():
+        org = [list(map(float, o.split(','))) for _, o, _ in items]
+        dest = [list(map(float, d.split(','))) for _, _, d in items]
+        responses = transit_estimator.to_baidu_responses(transit_estimator.estimate(org, dest, city_en))
+        for (i, _, _), response in zip(items, responses):
+            results[i] = parse_baidu_transport_info(params_list[i]['org'], params_list[i]['dest'], response)
+    return results
+
 tools_map = {
     "AttractionSearch": search_attraction_cache,
     "NearbyRestaurantSearch": search_nearby_restaurant_cache,
@@ -145,19 +283,50 @@ tools_map = {
 }
 
 
+QUERY_PROPERTIES = {
+    "min_cost": {
+        "type": "number",
+        "description": "可选，最低人均花费（元）"
+    },
+    "max_cost": {
+        "type": "number",
+        "description": "可选，最高人均花费（元），用于按预算过滤"
+    },
+    "sort_by": {
+        "type": "string",
+        "enum": ["cost", "cost_desc"],
+        "description": "可选，按花费升序(cost)或降序(cost_desc)排序"
+    },
+    "offset": {
+        "type": "integer",
+        "description": "可选，分页起始位置，默认0"
+    },
+    "limit": {
+        "type": "integer",
+        "description": "可选，最多返回的条数"
+    },
+    "exclude_names": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "可选，需要排除的名称列表（如已经安排过的地点）"
+    }
+}
+
+
 tools_desc = [
     {
         "type": "function",
         "function": {
             "name": "AttractionSearch",
-            "description": "搜索指定城市的景点信息，返回名称和票价等数据。",
+            "description": "搜索指定城市的景点信息，返回名称和票价等数据；可按花费过滤、排序、分页并排除已选景点。",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "city_name": {
                         "type": "string",
                         "description": "城市中文名称，例如：北京市"
-                    }
+                    },
+                    **QUERY_PROPERTIES
                 },
                 "required": ["city_name"]
             }
@@ -167,7 +336,7 @@ tools_desc = [
         "type": "function",
         "function": {
             "name": "NearbyRestaurantSearch",
-            "description": "查询指定城市中某个景点附近的餐厅信息，包括名称、类型和价格等。",
+            "description": "查询指定城市中某个景点附近的餐厅信息，包括名称、类型和价格等；可按花费过滤、排序、分页并排除已选餐厅。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -178,7 +347,13 @@ tools_desc = [
                     "city_name": {
                         "type": "string",
                         "description": "景点所在城市的中文名称，例如：北京市"
-                    }
+                    },
+                    "cuisine_category": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(CUISINE_MAP)},
+                        "description": "可选，只返回属于这些菜系大类的餐厅，取值与用户的饮食偏好一致"
+                    },
+                    **QUERY_PROPERTIES
                 },
                 "required": ["attraction", "city_name"]
             }
@@ -188,7 +363,7 @@ tools_desc = [
         "type": "function",
         "function": {
             "name": "NearbyHotelSearch",
-            "description": "查询指定城市中某个景点附近的酒店信息，包括名称、类型和价格等。",
+            "description": "查询指定城市中某个景点附近的酒店信息，包括名称、类型和价格等；可按花费过滤、排序、分页并排除已选酒店。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -199,7 +374,13 @@ tools_desc = [
                     "city_name": {
                         "type": "string",
                         "description": "景点所在城市的中文名称，例如：北京市"
-                    }
+                    },
+                    "hotel_type": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(HOTEL_MAP)},
+                        "description": "可选，只返回这些类型的酒店，取值与用户的住宿偏好一致"
+                    },
+                    **QUERY_PROPERTIES
                 },
                 "required": ["attraction", "city_name"]
             }
@@ -0,0 +1,94 @@
+"""agent 循环的结构化计时：每一步的 Thought/Action 调用、解析、工具执行、上下文裁剪记为一个 span，
+带耗时与 token 数，可导出为 JSONL 或 Chrome trace（chrome://tracing、Perfetto 可直接打开），并汇总成每次运行的统计。
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+TRACE_FORMATS = ['jsonl', 'chrome']
+
+
+class Tracer:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.spans = []
+        self.t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append({"name": name, "start": start - self.t0, "duration": end - start,
+                                   "tid": threading.get_ident(), **attrs})
+
+    def summary(self):
+        phases = {}
+        for name in dict.fromkeys(s["name"] for s in self.spans):
+            durations = np.array([s["duration"] for s in self.spans if s["name"] == name])
+            phases[name] = {"count": len(durations), "total": float(durations.sum()),
+                            "mean": float(durations.mean()), "max": float(durations.max())}
+        tools = {}
+        for s in self.spans:
+            if s["name"] == "tool":
+                stat = tools.setdefault(s.get("tool"), {"count": 0, "total": 0.})
+                stat["count"] += 1
+                stat["total"] += s["duration"]
+        return {
+            "wall_time": max((s["start"] + s["duration"] for s in self.spans), default=0.),
+            "steps": sum(s["name"] == "step" for s in self.spans),
+            "prompt_tokens": sum(s.get("prompt_tokens", 0) for s in self.spans),
+            "completion_tokens": sum(s.get("completion_tokens", 0) for s in self.spans),
+            "phases": phases,
+            "tools": tools,
+        }
+
+    def to_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+
+    def to_chrome_trace(self, path):
+        events = [{"name": s["name"] if s["name"] != "tool" else f"tool:{s.get('tool')}",
+                   "cat": s["name"], "ph": "X", "pid": 0, "tid": s["tid"],
+                   "ts": s["start"] * 1e6, "dur": s["duration"] * 1e6,
+                   "args": {k: v for k, v in s.items() if k not in ("name", "start", "duration", "tid")}}
+                  for s in self.spans]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def export(self, path, fmt='jsonl'):
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"trace format must be one of {TRACE_FORMATS}, got {fmt}")
+        if fmt == 'chrome':
+            self.to_chrome_trace(path)
+        else:
+            self.to_jsonl(path)
+
+
+class NullTracer:
+    """未开启追踪时使用，span 不做任何记录。"""
+
+    spans = []
+
+    def reset(self):
+        pass
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def summary(self):
+        return {}
+
+
+NULL_TRACER = NullTracer()
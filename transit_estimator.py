@@ -0,0 +1,76 @@
+"""离线交通估计：由起终点坐标的球面距离，结合各城市的速度与计价模型估计步行/公交/打车的距离、耗时和花费。
+
+所有计算对 OD 数组向量化，一次即可估计一整天的全部 OD 对；结果组织成百度 transit 接口的返回结构，
+由 tools.parse_baidu_transport_info 统一格式化。
+"""
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+
+# detour: 路网距离/直线距离；transit_speed、taxi_speed 单位 m/s；transit_overhead: 候车与进出站耗时（秒）
+# transit_fare: (起步价, 起步里程km, 每段里程km, 每段加价, 封顶)；taxi_fare: (起步价, 起步里程km, 每公里单价)
+TRANSIT_MODELS = {
+    'beijing': {'detour': 1.35, 'transit_speed': 6.0, 'transit_overhead': 600, 'taxi_speed': 7.0,
+                'transit_fare': (3, 6, 6, 1, 10), 'taxi_fare': (13, 3, 2.3)},
+    'shanghai': {'detour': 1.35, 'transit_speed': 6.2, 'transit_overhead': 600, 'taxi_speed': 7.0,
+                 'transit_fare': (3, 6, 10, 1, 15), 'taxi_fare': (14, 3, 2.5)},
+    'guangzhou': {'detour': 1.35, 'transit_speed': 6.0, 'transit_overhead': 600, 'taxi_speed': 7.5,
+                  'transit_fare': (2, 4, 6, 1, 14), 'taxi_fare': (12, 3, 2.6)},
+    'chengdu': {'detour': 1.3, 'transit_speed': 5.5, 'transit_overhead': 540, 'taxi_speed': 7.5,
+                'transit_fare': (2, 4, 6, 1, 10), 'taxi_fare': (9, 2, 1.9)},
+    'xian': {'detour': 1.3, 'transit_speed': 5.5, 'transit_overhead': 540, 'taxi_speed': 7.5,
+             'transit_fare': (2, 6, 8, 1, 10), 'taxi_fare': (9, 3, 2.0)},
+}
+WALK_SPEED = 1.2
+WALK_MAX_DISTANCE = 1500
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def _stepped_fare(km, base, base_km, step_km, step_fare, cap):
+    extra = np.ceil(np.maximum(km - base_km, 0) / step_km) * step_fare
+    return np.minimum(base + extra, cap)
+
+
+def estimate(org_coords, dest_coords, city_en):
+    """org_coords/dest_coords: 形如 (N, 2) 的 [lat, lng] 数组，返回各方式的距离(米)、耗时(秒)、花费(元)数组。"""
+    model = TRANSIT_MODELS[city_en]
+    org = np.asarray(org_coords, dtype=float).reshape(-1, 2)
+    dest = np.asarray(dest_coords, dtype=float).reshape(-1, 2)
+    distance = haversine(org[:, 0], org[:, 1], dest[:, 0], dest[:, 1]) * model['detour']
+    km = distance / 1000
+
+    taxi_base, taxi_base_km, taxi_per_km = model['taxi_fare']
+    return {
+        'distance': np.rint(distance).astype(int),
+        'walk_duration': np.rint(distance / WALK_SPEED).astype(int),
+        'walkable': distance <= WALK_MAX_DISTANCE,
+        'transit_duration': np.rint(distance / model['transit_speed'] + model['transit_overhead']).astype(int),
+        'transit_price': _stepped_fare(km, *model['transit_fare']).astype(int),
+        'taxi_duration': np.rint(distance / model['taxi_speed']).astype(int),
+        'taxi_price': np.round(taxi_base + np.maximum(km - taxi_base_km, 0) * taxi_per_km, 1),
+    }
+
+
+def to_baidu_responses(result):
+    responses = []
+    for i in range(len(result['distance'])):
+        distance = int(result['distance'][i])
+        routes = []
+        if result['walkable'][i]:
+            routes.append({'distance': distance, 'duration': int(result['walk_duration'][i]), 'price': 0,
+                           'steps': [[{'instructions': f"步行约{distance}米"}]]})
+        else:
+            routes.append({'distance': distance, 'duration': int(result['transit_duration'][i]),
+                           'price': int(result['transit_price'][i]),
+                           'steps': [[{'instructions': "步行至附近公交/地铁站"}],
+                                     [{'instructions': f"乘坐公共交通约{distance / 1000:.1f}公里"}],
+                                     [{'instructions': "步行至目的地"}]]})
+        taxi = {'distance': distance, 'duration': int(result['taxi_duration'][i]),
+                'detail': [{'total_price': float(result['taxi_price'][i])}]}
+        responses.append({'result': {'routes': routes, 'taxi': taxi}})
+    return responses
@@ -1,15 +1,40 @@
 from llm_api import LLMCaller
 from tools import tools_map, tools_desc
 from prompts import REACT_PROMPT
+from context import make_context
+from tracing import NULL_TRACER
+from poi_store import get_poi_store
 import ast
 import re
 import json
 
 
+def to_cost(value):
+    return float(value) if value != 'N/A' else 0.
+
+
 class Notebook:
-    def __init__(self):
+    """validate=True 时写入前检查 POI 名称是否存在于城市数据、景点/餐厅是否重复、cost 是否为数字，不合规的写入
+    直接拒绝并在 Observation 中说明原因；同时维护花费台账，超出预算只在 Observation 中提示，不拒绝写入，
+    以免住宿、交通等必需的写入被拒后无法产出计划。"""
+
+    def __init__(self, city_en=None, validate=False):
+        self.city_en = city_en
+        self.validate = validate
+        if validate and not city_en:
+            raise ValueError("notebook validation requires city_en")
+        self.reset()
+
+    def reset(self):
         self.data = None
         self.date_list = None
+        self.budget = None
+        self._date_index = {}
+        self.day_costs = []
+        self.total_cost = 0.
+        self._used_attractions = {}
+        self._used_restaurants = {}
+        self.violations = []
 
     def init(self, params):
         if type(params) == str:
@@ -25,8 +50,62 @@ class Notebook:
                       "transportation": {},
                       "cost_per_capita": {}
                       } for d in self.date_list]
+        self._date_index = {}
+        for idx, d in enumerate(self.date_list):
+            self._date_index.setdefault(d, idx)
+        self.day_costs = [0.] * len(self.date_list)
+        self.total_cost = 0.
+        self._used_attractions = {}
+        self._used_restaurants = {}
         return '笔记本初始化成功！'
 
+    def _day_cost(self, idx):
+        day = self.data[idx]
+        return sum(to_cost(x) for x in day['cost_per_capita'].values()) * day['num_people']
+
+    def _check(self, typ, idx, cur_data):
+        store = get_poi_store(self.city_en)
+        if typ == 'attraction':
+            names = [attr_dict['name'] for attr_dict in cur_data]
+            for pos, name in enumerate(names):
+                if name not in store.names('attraction'):
+                    return f"景点“{name}”不在景点数据中，请使用 AttractionSearch 返回的景点名称。"
+                if name in self._used_attractions or name in names[:pos]:
+                    used_date = self.date_list[self._used_attractions.get(name, idx)]
+                    return f"景点“{name}”已安排在 {used_date}，整个行程中同一景点不能重复游览。"
+        elif typ in ['breakfast', 'lunch', 'dinner']:
+            name = cur_data['name']
+            if name not in store.names('restaurant'):
+                return f"餐厅“{name}”不在餐厅数据中，请使用 NearbyRestaurantSearch 返回的餐厅名称。"
+            used = self._used_restaurants.get(name)
+            if used and used != (idx, typ):
+                return f"餐厅“{name}”已安排在 {self.date_list[used[0]]} 的 {used[1]}，整个行程中同一餐厅不能重复。"
+        elif typ == 'accommodation':
+            name = cur_data['name']
+            if name not in store.names('hotel'):
+                return f"酒店“{name}”不在酒店数据中，请使用 NearbyHotelSearch 返回的酒店名称。"
+
+        costs = [attr_dict['cost'] for attr_dict in cur_data] if typ == 'attraction' else [cur_data.get('cost', 0.)]
+        try:
+            for cost in costs:
+                to_cost(cost)
+        except (TypeError, ValueError):
+            return "cost 必须是数字。"
+        return None
+
+    def _budget_warning(self):
+        if self.budget is None or self.total_cost <= self.budget:
+            return ""
+        return (f"注意：行程总花费已达 {self.total_cost:.0f} 元，超出预算 {self.budget} 元，"
+                f"后续请选择更便宜的选项，或用更便宜的餐厅、酒店重新写入已有的安排。")
+
+    def _ledger(self):
+        days = "，".join(f"{d} {cost:.0f}元" for d, cost in zip(self.date_list, self.day_costs))
+        summary = f"当前累计花费 {self.total_cost:.0f} 元（{days}）"
+        if self.budget is not None:
+            summary += f"，预算 {self.budget} 元，剩余 {self.budget - self.total_cost:.0f} 元"
+        return summary + "。"
+
     def write(self, info):
 
         if not self.data:
@@ -42,9 +121,8 @@ class Notebook:
             return "写入信息类型错误！类型必须是['attraction', 'breakfast', 'lunch', 'dinner', 'accommodation', 'transportation']之一"
 
         cur_date = info['date']
-        try:
-            idx = self.date_list.index(cur_date)
-        except ValueError:
+        idx = self._date_index.get(cur_date)
+        if idx is None:
             return f"写入失败：在笔记本中找不到日期 {cur_date} 。"
 
         cur_data = info['data']
@@ -53,21 +131,40 @@ class Notebook:
             for attr_dict in cur_data:
                 if not all(k in attr_dict for k in ['name','cost']):
                     return "写入的景点信息缺少必要字段，请确保包含 name 和 cost。"
+        elif typ in ['breakfast', 'lunch', 'dinner']:
+            if not all(k in cur_data for k in ['name', 'keytag', 'cost']):
+                return "写入的餐厅信息缺少必要字段，请确保包含 name、keytag 和 cost。"
+        elif typ == 'accommodation':
+            if not all(k in cur_data for k in ['name', 'keytag', 'cost']):
+                return "写入的住宿信息缺少必要字段，请确保包含 name、keytag 和 cost。"
+        elif typ == 'transportation':
+            if not 'cost' in cur_data:
+                return "写入的交通信息缺少cost字段！"
+
+        if self.validate:
+            error = self._check(typ, idx, cur_data)
+            if error:
+                self.violations.append({"date": cur_date, "info_class": typ, "error": error})
+                return f"写入失败：{error}"
+
+        if typ == 'attraction':
+            for attr_dict in cur_data:
                 attr_name = attr_dict['name']
                 attr_cost = attr_dict['cost']
                 self.data[idx]['visit_attractions'].append(attr_name)
                 self.data[idx]['cost_per_capita'][attr_name] = attr_cost
+                self._used_attractions.setdefault(attr_name, idx)
 
         elif typ in ['breakfast', 'lunch', 'dinner']:
-            if not all(k in cur_data for k in ['name', 'keytag', 'cost']):
-                return "写入的餐厅信息缺少必要字段，请确保包含 name、keytag 和 cost。"
+            previous = self.data[idx][typ].get('name')
+            if self._used_restaurants.get(previous) == (idx, typ):
+                del self._used_restaurants[previous]
+            self._used_restaurants.setdefault(cur_data['name'], (idx, typ))
             self.data[idx][typ]['name'] = cur_data['name']
             self.data[idx][typ]['cuisines'] = cur_data['keytag']
             self.data[idx]['cost_per_capita'][typ] = cur_data['cost']
 
         elif typ == 'accommodation':
-            if not all(k in cur_data for k in ['name', 'keytag', 'cost']):
-                return "写入的住宿信息缺少必要字段，请确保包含 name、keytag 和 cost。"
             self.data[idx][typ] = {
                 "name": cur_data['name'],
                 "type": cur_data['keytag']
@@ -75,24 +172,43 @@ class Notebook:
             self.data[idx]['cost_per_capita'][typ] = cur_data['cost']
 
         elif typ == 'transportation':
-            if not 'cost' in cur_data:
-                return "写入的交通信息缺少cost字段！"
             self.data[idx]['cost_per_capita']['transit'] = (
-                    self.data[idx]['cost_per_capita'].get('transit', 0.) + cur_data.get('cost', 0.))
+                    to_cost(self.data[idx]['cost_per_capita'].get('transit', 0.)) + to_cost(cur_data.get('cost', 0.)))
             self.data[idx][typ].update({k: v for k, v in cur_data.items() if k != 'cost'})
+
+        try:
+            day_cost = self._day_cost(idx)
+            self.total_cost += day_cost - self.day_costs[idx]
+            self.day_costs[idx] = day_cost
+        except (TypeError, ValueError):  # 未开启校验时 cost 可能不是数字，台账不再更新
+            pass
+        if self.validate:
+            warning = self._budget_warning()
+            if warning:
+                self.violations.append({"date": cur_date, "info_class": typ, "warning": warning})
+            return "信息写入成功！" + self._ledger() + warning
         return "信息写入成功！"
 
     def read(self):
         return self.data
 
 
+STEP_MODES = ['react', 'fused']  # react: Thought、Action 各一次调用; fused: 一次调用同时给出 Thought 和工具调用
+
+
 class ReActTravelAgent:
-    def __init__(self, platform, model_name):
+    def __init__(self, platform, model_name, step_mode='react', context_strategy='prune', context_kwargs=None,
+                 llm_cache=None, tracer=None, notebook_validation=False, city_en=None):
+        if step_mode not in STEP_MODES:
+            raise ValueError(f"step_mode must be one of {STEP_MODES}, got {step_mode}")
         self.platform = platform
         self.model_name = model_name
-        self.llm = LLMCaller(platform, model_name)
-        self.notebook = Notebook()
-        self.tools = tools_map
+        self.step_mode = step_mode
+        self.context = make_context(context_strategy, **(context_kwargs or {}))
+        self.llm = LLMCaller(platform, model_name, cache=llm_cache)
+        self.tracer = tracer or NULL_TRACER
+        self.notebook = Notebook(city_en, validate=notebook_validation)
+        self.tools = dict(tools_map)  # 每个 agent 独立的工具表，避免并发时互相覆盖笔记本工具
         self.tools['NotebookInit'] = self.notebook.init
         self.tools['NotebookWrite'] = self.notebook.write
         self.tools['PlanOutput'] = self.notebook.read
@@ -107,7 +223,9 @@ class ReActTravelAgent:
         self.finished = False
         self.messages = [{"role": "system", "content": REACT_PROMPT},
                          {"role": "user", "content": self.query}]
-        self.notebook.__init__()
+        self.notebook.reset()
+        self.context.reset()
+        self.tracer.reset()
 
     def _prune_messages(self, drop_observations=True, keep_last_observations=3):
         obs_indices = []
@@ -123,29 +241,41 @@ class ReActTravelAgent:
                not (idx in obs_indices and idx not in keep_obs_indices)
         ]
 
-    def plan_trip(self, query, reset=True):
+    def plan_trip(self, query, reset=True, budget=None):
         self.query = query
         if reset:
             self.__reset_agent()
+        if budget is not None:
+            self.notebook.budget = budget
 
         while not self.finished and not self.is_halted():
             self.step()
         return self.notebook.data
 
     def step(self, is_log=False):
-        self._prune_messages(keep_last_observations=2)
+        with self.tracer.span('step', step=self.step_n):
+            self._step(is_log)
 
-        thought = self.thought()
+    def _step(self, is_log=False):
+        with self.tracer.span('prune', step=self.step_n):
+            self.context.before_step(self)
+
+        if self.step_mode == 'fused':
+            thought, action = self.thought_action()
+        else:
+            thought, action = self.thought(), None
         self.messages.append({"role": "assistant", "content": thought})
         if is_log:
             print(thought)
-        action = self.action()
+        if action is None:
+            action = self.action()
         if action["type"] == "tool_call":
             tool_name = action["tool_name"]
             raw_args = action["tool_args"]
             parse_info = 'done'
         else:  # action["type"] == "message"
-            tool_name, raw_args, parse_info = self.parse_tool_call_from_message(action['content'])
+            with self.tracer.span('parse', step=self.step_n):
+                tool_name, raw_args, parse_info = self.parse_tool_call_from_message(action['content'])
 
         if self.finish_detect(tool_name):
             self.finished = True
@@ -154,11 +284,14 @@ class ReActTravelAgent:
         if tool_name and raw_args:
             act_msg = f"Action {self.step_n}: {tool_name}{raw_args}"
             try:
-                args = ast.literal_eval(raw_args)
+                with self.tracer.span('parse', step=self.step_n):
+                    args = ast.literal_eval(raw_args)
                 if not isinstance(args, dict):
                     obs_msg = f"Observation {self.step_n}: 工具调用失败，参数必须是dict类型！"
                 else:
-                    result = self.observation(tool_name, args)
+                    with self.tracer.span('tool', step=self.step_n, tool=tool_name) as span:
+                        result = self.observation(tool_name, args)
+                        span["obs_chars"] = len(result)
                     obs_msg = f"Observation {self.step_n}: {result}"
             except Exception as e:
                 obs_msg = f"Observation {self.step_n}: 工具调用参数解析失败: {e}，请重新确认要执行的动作！"
@@ -228,24 +361,40 @@ class ReActTravelAgent:
     def finish_detect(tool_name):
         return tool_name in {"PlanOutput"}
 
+    def format_thought(self, content):
+        content = content.strip()
+        content = content.split("Action")[0].strip() if "Action" in content else content
+        if not content:
+            content = "当前信息不足，我将继续推理。"
+
+        content = re.sub(r"^.*?Thought \d+: ", "", content)  # 移除 Thought {N}: 前缀及之前的内容
+        content = re.sub(r"^.*?Thought", "", content)  # 移除 Thought 前缀及之前的内容
+        return f"Thought {self.step_n}: {content}"
+
+    def ask(self, phase, control, tools, max_tokens):
+        with self.tracer.span('context', step=self.step_n) as span:
+            n_decisions = len(self.context.decisions)
+            messages = self.context.build(self.messages, {"role": "user", "content": control})
+            if len(self.context.decisions) > n_decisions:
+                span.update({k: v for k, v in self.context.decisions[-1].items() if k != 'step'})
+        with self.tracer.span(phase, step=self.step_n) as span:
+            response = self.llm.get_response(messages, tools=tools, max_tokens=max_tokens)
+            span.update(getattr(self.llm, 'last_usage', None) or {})
+        return response
+
     def thought(self):
-        self.messages.append({"role": "user", "content": "你接下来要进行的是Thought"})
-        response = self.llm.get_response(self.messages, tools=None, max_tokens=512)
+        response = self.ask('thought', "你接下来要进行的是Thought", tools=None, max_tokens=512)
         if response["type"] == "message":
-            content = response["content"].strip()
-            content = content.split("Action")[0].strip() if "Action" in content else content
-            if not content:
-                content = "当前信息不足，我将继续推理。"
-
-            content = re.sub(r"^.*?Thought \d+: ", "", content)  # 移除 Thought {N}: 前缀及之前的内容
-            content = re.sub(r"^.*?Thought", "", content)  # 移除 Thought 前缀及之前的内容
-            content = f"Thought {self.step_n}: {content}"
-            return content
+            return self.format_thought(response["content"])
         return f"Thought {self.step_n}: 当前信息不足，但我会继续推理。"
 
+    def thought_action(self):
+        response = self.ask('thought_action', "你接下来要进行的是Thought和Action：先用自然语言简要给出Thought，再调用一个工具完成Action",
+                            tools=tools_desc, max_tokens=1024)
+        return self.format_thought(response.get("content", "")), response
+
     def action(self):
-        self.messages.append({"role": "user", "content": "你接下来要进行的是Action"})
-        return self.llm.get_response(self.messages, tools=tools_desc, max_tokens=512)
+        return self.ask('action', "你接下来要进行的是Action", tools=tools_desc, max_tokens=512)
 
     def observation(self, tool_name, tool_args):
         if tool_name not in self.tools:
@@ -0,0 +1,146 @@
+"""批量评测多个模型、多个城市生成的旅行计划，汇总成一份 JSON 报告。
+
+每个 (城市, 模型) 对在独立进程中评测；每条计划的校验结果按 (查询约束, 计划内容, POI 数据版本, 校验逻辑版本) 的哈希缓存，
+重跑时只校验新增或改动过的计划。
+    python eval_runner.py --cities beijing shanghai --models citygpt-t-beijing gpt-4o-mini --workers=4
+不指定 --models 时自动发现 output/{city}/ 下所有包含 generated_plans.json 的模型目录。
+"""
+import sys
+sys.path.append("..")
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import pandas as pd
+
+from config import CITY_MAP, CUISINE_MAP
+from kv_store import SQLiteKVStore, hash_key
+from snapshot import TABLES, csv_path, snapshot_dir, snapshot_exists
+import poi_store
+import trip_eval
+
+METRICS = ["delivery_rate", "commonsense_micro", "commonsense_macro", "preference_micro", "preference_macro",
+           "final_pass_rate"]
+
+
+def data_version(city_en, base_dir):
+    files = []
+    for table in TABLES:
+        path = os.path.join(snapshot_dir(city_en, table, base_dir), 'meta.json') \
+            if snapshot_exists(city_en, table, base_dir) else csv_path(city_en, table, base_dir)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            files.append([table, stat.st_size, stat.st_mtime_ns])
+    return hash_key(files)
+
+
+@lru_cache(maxsize=None)
+def validator_version():
+    """校验逻辑的版本：菜系映射和 trip_eval、poi_store（菜系归类）的源码，任一改动都使旧的缓存结果失效。"""
+    sources = []
+    for module in (trip_eval, poi_store):
+        with open(module.__file__, 'rb') as f:
+            sources.append(hashlib.md5(f.read()).hexdigest())
+    return hash_key([CUISINE_MAP, sources])
+
+
+def verdict_key(version, city_en, query_data, plan):
+    constraint = [int(query_data['days']), int(query_data['people_number']), str(query_data['preference_constraint'])]
+    return hash_key([validator_version(), version, city_en, constraint, plan])
+
+
+def plans_path(output_dir, city_en, model_name):
+    return os.path.join(output_dir, city_en, model_name, 'generated_plans.json')
+
+
+def discover_models(output_dir, city_en):
+    city_dir = os.path.join(output_dir, city_en)
+    if not os.path.isdir(city_dir):
+        return []
+    return sorted(m for m in os.listdir(city_dir) if os.path.exists(plans_path(output_dir, city_en, m)))
+
+
+def evaluate_pair(city_en, model_name, database_dir, output_dir, cache_path):
+    t1 = time.time()
+    trip_eval.DATABASE_DIR = database_dir
+    query_records = pd.read_csv(f'{database_dir}/{city_en}/travel_queries.csv', index_col=None, header=0) \
+        .to_dict(orient='records')
+    with open(plans_path(output_dir, city_en, model_name), 'r', encoding='utf-8') as f:
+        plans = trip_eval.to_pending_plans(json.load(f))
+    if len(plans) != len(query_records):
+        raise ValueError(f"{city_en}/{model_name}: {len(plans)} plans for {len(query_records)} queries")
+
+    validator = trip_eval.get_validator(city_en, database_dir)
+    cache = SQLiteKVStore(cache_path, table='trip_verdict') if cache_path else None
+    version = data_version(city_en, database_dir)
+    plan_checkouts, new_verdicts = [], []
+    for query_data, plan in zip(query_records, plans):
+        key = verdict_key(version, city_en, query_data, plan) if cache is not None and plan else None
+        verdict = cache.get(key) if key else None
+        if verdict is None:
+            verdict = validator.check(query_data, plan)
+            if key:
+                new_verdicts.append((key, verdict))
+        plan_checkouts.append(verdict)
+    if new_verdicts:
+        cache.set_many(new_verdicts)
+    if cache is not None:
+        cache.close()
+
+    result = {"city": city_en, "model": model_name, "queries": len(query_records),
+              "cached_verdicts": sum(bool(p) for p in plans) - len(new_verdicts) if cache is not None else 0}
+    result.update(trip_eval.summarize_checkouts(plans, plan_checkouts))
+    result["eval_time"] = time.time() - t1
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', type=str, nargs='+', default=list(CITY_MAP))
+    parser.add_argument('--models', type=str, nargs='+', default=None, help='默认自动发现输出目录下的所有模型')
+    parser.add_argument('--database_dir', type=str, default=trip_eval.DATABASE_DIR)
+    parser.add_argument('--output_dir', type=str, default='../output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--no_cache', action='store_true', help='不读写校验结果缓存')
+    parser.add_argument('--report', type=str, default='../output/trip_eval_report.json')
+    args = parser.parse_args()
+    cache_path = None if args.no_cache else os.path.join(args.database_dir, 'trip_eval_cache.sqlite')
+
+    pairs = [(city_en, model_name) for city_en in args.cities
+             for model_name in (args.models or discover_models(args.output_dir, city_en))
+             if os.path.exists(plans_path(args.output_dir, city_en, model_name))]
+    print(f'待评测 {len(pairs)} 个 (城市, 模型) 组合')
+
+    t1 = time.time()
+    results, errors = [], []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(pairs) or 1))) as executor:
+        futures = {executor.submit(evaluate_pair, city_en, model_name, args.database_dir, args.output_dir, cache_path):
+                   (city_en, model_name) for city_en, model_name in pairs}
+        for future in as_completed(futures):
+            city_en, model_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f'[{city_en}/{model_name}] 评测失败：{e}')
+                errors.append({"city": city_en, "model": model_name, "error": str(e)})
+                continue
+            print(f"[{city_en}/{model_name}] DR={result['delivery_rate']:.2%}, FPR={result['final_pass_rate']:.2%}, "
+                  f"缓存命中 {result['cached_verdicts']}/{result['queries']}, 耗时 {result['eval_time']:.1f}s")
+            results.append(result)
+    results.sort(key=lambda r: (r["city"], r["model"]))
+
+    print(f"\n{'city':<12}{'model':<32}" + "".join(f"{m:>20}" for m in METRICS))
+    for r in results:
+        print(f"{r['city']:<12}{r['model']:<32}" + "".join(f"{r[m]:>20.2%}" for m in METRICS))
+
+    if os.path.dirname(args.report):
+        os.makedirs(os.path.dirname(args.report), exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump({"args": vars(args), "total_time": time.time() - t1, "results": results, "errors": errors},
+                  f, ensure_ascii=False, indent=2)
+    print(f'评测报告已写入 {args.report}')
@@ -2,28 +2,94 @@ import sys
 sys.path.append("..")
 
 from prompts import KNOW_EVAL_PROMPT
-from llm_api import LLMCaller
+from llm_api import AsyncLLMCaller, ResponseCache
+from kv_store import hash_key
 
+import asyncio
 import os
 import json
 import numpy as np
 import argparse
 
+CHOICES = ['A', 'B', 'C', 'D']
+# full: 生成完整回复后整体比对; single_token: 只生成 1 个 token; logprobs: 只生成 1 个 token，取 A/B/C/D 中 logprob 最大者
+SCORING_MODES = {
+    'full': {},
+    'single_token': {'max_tokens': 1},
+    'logprobs': {'max_tokens': 1, 'top_logprobs': 10},
+}
 
-def mc_eval(llm, mc_dict):
-    cnt = 0.
-    for idx, mc in enumerate(mc_dict):
-        messages = [{"role": "system", "content": KNOW_EVAL_PROMPT},
-                    {"role": "user", "content":
-                        "Question: " + mc['question'] + "\n" +
-                        "\n ".join(f"{key} {value}" for key, value in mc['options'].items())}]
-        correct_answer = mc['correct_answer']
-        response = llm.get_response(messages, tools=None)['content']
-        answer = response.strip().replace(" ", "").replace("\n", "")
-        if answer == correct_answer:
-            cnt += 1
-    return cnt / len(mc_data)
 
+def mc_messages(mc):
+    return [{"role": "system", "content": KNOW_EVAL_PROMPT},
+            {"role": "user", "content":
+                "Question: " + mc['question'] + "\n" +
+                "\n ".join(f"{key} {value}" for key, value in mc['options'].items())}]
+
+
+def extract_answer(response, scoring='full'):
+    if scoring == 'logprobs':
+        scores = {}
+        for token, logprob in response.get('top_logprobs', {}).items():
+            letter = token.strip().upper()
+            if letter in CHOICES:
+                scores[letter] = max(scores.get(letter, -np.inf), logprob)
+        if scores:
+            return max(scores, key=scores.get)
+    answer = response['content'].strip().replace(" ", "").replace("\n", "")
+    return answer if scoring == 'full' else answer[:1]
+
+
+class MCResultCache:
+    """单个选择题文件的作答缓存（题目+选项的哈希 -> 模型答案），重跑时只评测新增或改动过的题目。"""
+
+    def __init__(self, path, scoring):
+        self.path = path
+        self.scoring = scoring
+        self.answers = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.answers = json.load(f)
+
+    def key(self, mc):
+        return hash_key([self.scoring, mc['question'], mc['options']])
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.answers, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+async def mc_eval_async(llm, mc_data, scoring='full', cache=None):
+    cache = cache or MCResultCache(None, scoring)
+    keys = [cache.key(mc) for mc in mc_data]
+    pending = [i for i, key in enumerate(keys) if key not in cache.answers]
+    responses = await llm.get_responses([mc_messages(mc_data[i]) for i in pending], tools=None,
+                                        return_exceptions=True, **SCORING_MODES[scoring])
+    errors = 0
+    for i, response in zip(pending, responses):
+        if isinstance(response, Exception):  # 失败的题目不写缓存，计为答错，重跑时会重新评测
+            errors += 1
+            continue
+        cache.answers[keys[i]] = extract_answer(response, scoring)
+    cache.save()
+    correct = sum(cache.answers.get(key) == mc['correct_answer'] for key, mc in zip(keys, mc_data))
+    return correct / len(mc_data), len(pending), errors
+
+
+async def eval_files(llm, base_dir, files, scoring, result_dir):
+    async def eval_file(file):
+        with open(os.path.join(base_dir, file), 'r', encoding='utf-8') as f:
+            mc_data = json.load(f)
+        cache = MCResultCache(os.path.join(result_dir, file) if result_dir else None, scoring)
+        acc, evaluated, errors = await mc_eval_async(llm, mc_data, scoring, cache)
+        print(f"{file}: acc={acc:.4f}, 本次评测 {evaluated}/{len(mc_data)} 题" + (f"，失败 {errors} 题" if errors else ""))
+        return acc
+    return await asyncio.gather(*(eval_file(file) for file in files))
 
 
 if __name__ == '__main__':
@@ -31,10 +97,15 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--city_en', type=str, default='shanghai')
     parser.add_argument('--platform', type=str, default='vLLM')
+    parser.add_argument('--model_name', type=str, default=None, help='默认为 citygpt-t-{city_en}')
+    parser.add_argument('--llm_cache', action='store_true', help='缓存 LLM 回复，重跑时直接复用')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时在途的请求数，1 为逐题串行')
+    parser.add_argument('--scoring', type=str, default='full', choices=list(SCORING_MODES))
+    parser.add_argument('--rerun', action='store_true', help='忽略已有的作答缓存，全部重新评测')
     args = parser.parse_args()
     platform = args.platform
     city_en = args.city_en
-    model_name = 'citygpt-travel-'+ city_en
+    model_name = args.model_name or 'citygpt-t-' + city_en
 
     CITY_FILES = ['road_len_mc.json', 'road_link_mc.json', 'road_od_mc.json', 'poi_mc.json']
     TRIP_FILES = ['attractions_address_mc.json', 'attractions_price_mc.json', 'attractions_open_time_mc.json',
@@ -43,20 +114,23 @@ if __name__ == '__main__':
 
     print(f"City: {city_en}-------------------------------------------------->")
     base_dir = f'../database/{city_en}/eval/mc'
-    llm = LLMCaller(platform=platform, model_name=model_name)
-    city_qa = []
-    for file in CITY_FILES:
-        with open(os.path.join(base_dir, file), 'r', encoding='utf-8') as f:
-            mc_data = json.load(f)
-        acc = mc_eval(llm, mc_data)
-        city_qa.append(acc)
+    result_dir = f'../output/{city_en}/{model_name}/know_eval/{args.scoring}'
+    if args.rerun:
+        for file in CITY_FILES + TRIP_FILES:
+            if os.path.exists(os.path.join(result_dir, file)):
+                os.remove(os.path.join(result_dir, file))
+    cache = ResponseCache() if args.llm_cache else None
+
+    async def main():
+        llm = AsyncLLMCaller(platform=platform, model_name=model_name, max_in_flight=args.concurrency, cache=cache)
+        try:
+            return await eval_files(llm, base_dir, CITY_FILES, args.scoring, result_dir), \
+                await eval_files(llm, base_dir, TRIP_FILES, args.scoring, result_dir)
+        finally:
+            await AsyncLLMCaller.aclose_all()
+
+    city_qa, trip_qa = asyncio.run(main())
     city_qa = np.mean(city_qa)
     print(city_en, "CityQA:", city_qa)
-    trip_qa = []
-    for file in TRIP_FILES:
-        with open(os.path.join(base_dir, file), 'r', encoding='utf-8') as f:
-            mc_data = json.load(f)
-        acc = mc_eval(llm, mc_data)
-        trip_qa.append(acc)
     trip_qa = np.mean(trip_qa)
-    print(city_en, "TripQA:", trip_qa)
\ No newline at end of file
+    print(city_en, "TripQA:", trip_qa)
@@ -2,12 +2,16 @@ import sys
 sys.path.append("..")
 
 import argparse
-from config import CITY_MAP, CUISINE_MAP
+from config import CITY_MAP
 from tools import search_baidu_transport
+from snapshot import NameIndex
+from poi_store import cuisine_category
 import ast
 import pandas as pd
 import json
-from collections import defaultdict
+from functools import lru_cache
+
+DATABASE_DIR = '../database'
 
 
 def is_valid_fields(plan):
@@ -35,57 +39,58 @@ def is_valid_peoples(query_data, plan):
     return True, None
 
 
-def is_valid_attractions(plan, city_en):
-    all_attractions = pd.read_csv(f'../database/{city_en}/amap/attraction_cache.csv')['name'].values
+def _contains(names, name):
+    return isinstance(name, str) and name in names
+
+
+def is_valid_attractions(plan, all_attractions):
     for day_plan in plan:
         if day_plan.get('visit_attractions'):
             attractions = day_plan['visit_attractions']
             for attract in attractions:
-                if attract not in all_attractions:
+                if not _contains(all_attractions, attract):
                     return False, "Invalid Attraction"
     return True, None
 
-def is_valid_restaurants(plan, city_en):
-    all_restaurants = pd.read_csv(f'../database/{city_en}/amap/restaurant_cache.csv')['name'].values
+def is_valid_restaurants(plan, all_restaurants):
     for day_plan in plan:
         restaurants = [day_plan.get(diet).get('name') for diet in ['breakfast', 'lunch', 'dinner']
                        if isinstance(day_plan.get(diet), dict)]
         for rest in restaurants:
-            if rest not in all_restaurants:
+            if not _contains(all_restaurants, rest):
                 return False, "Invalid Restaurant"
     return True, None
 
 
-def is_valid_accommodations(plan, city_en):
-    all_accommodations = pd.read_csv(f'../database/{city_en}/amap/hotel_cache.csv')['name'].values
+def is_valid_accommodations(plan, all_accommodations):
     for day in range(len(plan)):
         day_plan = plan[day]
         accommodation = day_plan.get("accommodation")
         if not isinstance(accommodation, dict) or not accommodation:
             return False, f"Accommodation Missing on Day {day + 1}"
         acc_name = accommodation.get("name")
-        if acc_name not in all_accommodations:
+        if not _contains(all_accommodations, acc_name):
             return False, f"Invalid Accommodation '{acc_name}' on Day {day + 1}"
     return True, None
 
 def is_no_repeated_attractions(plan):
-    observed_attractions = []
+    observed_attractions = set()
     error_info = "Attraction is Repeated"
     for day_plan in plan:
         if day_plan.get('visit_attractions'):
             attractions = day_plan['visit_attractions']
             for attract in attractions:
                 if attract not in observed_attractions:
-                    observed_attractions.append(attract)
+                    observed_attractions.add(attract)
                 else:
                     return False, error_info
     return True, None
 
 def is_no_repeated_restaurants(plan):
-    observed_restaurants = []
+    observed_restaurants = set()
     def check_and_add_restaurant(restaurant_name):
         if restaurant_name not in observed_restaurants:
-            observed_restaurants.append(restaurant_name)
+            observed_restaurants.add(restaurant_name)
             return True
         return False
 
@@ -116,8 +121,8 @@ def is_available_transportation(plan, city_en):
     return True, None
 
 
-def is_reasonable_budget(query_data, plan):
-    pre_budget = eval(query_data['preference_constraint'])['budget']
+def is_reasonable_budget(preference, plan):
+    pre_budget = preference['budget']
     total_cost = 0
     for day_plan in plan:
         day_cost = sum([float(x) if x != 'N/A' else 0 for x in day_plan['cost_per_capita'].values()]) * day_plan['num_people']
@@ -128,28 +133,16 @@ def is_reasonable_budget(query_data, plan):
         return False, "Overspend Budget"
 
 
-def is_favorite_cuisine(query_data, plan):
-    try:
-        preference = ast.literal_eval(query_data['preference_constraint'])
-    except Exception:
-        return True, None
-
+def is_favorite_cuisine(preference, plan):
     pre_cuisines = preference.get('cuisines', None)
     if not pre_cuisines:
         return True, None
 
-    cuisine_categories = {category: set(cuisines) for category, cuisines in CUISINE_MAP.items()}
-    def get_category(cuisine):
-        for category, cuisines in cuisine_categories.items():
-            if cuisine in cuisines:
-                return category
-        return None
-
     for day_plan in plan:
         cuisines = [day_plan.get(diet, {}).get('cuisines', '') for diet in ['breakfast', 'lunch', 'dinner'] if day_plan.get(diet)]
         cuisines = [cuisine for cuisine in cuisines if cuisine]
         for cuisine in cuisines:
-            category = get_category(cuisine)
+            category = cuisine_category(cuisine)
             if category:
                 if category not in pre_cuisines:
                     return False, "Unsatisfied Cuisines"
@@ -158,8 +151,8 @@ def is_favorite_cuisine(query_data, plan):
     return True, None
 
 
-def is_preferred_hotel_type(query_data, plan):
-    pre_types = eval(query_data['preference_constraint']).get('hotel', None)
+def is_preferred_hotel_type(preference, plan):
+    pre_types = preference.get('hotel', None)
     if pre_types:
         for day in range(len(plan)):
             day_plan = plan[day]
@@ -172,26 +165,68 @@ def is_preferred_hotel_type(query_data, plan):
                 return False, f"Unsatisfied Hotel Type on Day {day + 1}"
     return True, None
 
-def commonsense_constraints(query_data, plan, city_en):
-    res = {
-        "is_valid_fields": is_valid_fields(plan),
-        "is_valid_days": is_valid_days(query_data, plan),
-        "is_valid_attractions": is_valid_attractions(plan, city_en),
-        "is_valid_restaurants": is_valid_restaurants(plan, city_en),
-        "is_valid_accommodations": is_valid_accommodations(plan, city_en),
-        # "is_available_transportation": is_available_transportation(plan, city_en),
-        "is_no_repeated_attractions": is_no_repeated_attractions(plan),
-        "is_no_repeated_restaurants": is_no_repeated_restaurants(plan),
-    }
-    return res
 
-def preference_constraint(query_data, plan):
-    res =  {
-        "is_reasonable_budget": is_reasonable_budget(query_data, plan),
-        "is_favorite_cuisine": is_favorite_cuisine(query_data, plan),
-        "is_preferred_hotel_type": is_preferred_hotel_type(query_data, plan),
-    }
-    return res
+def parse_preference(value):
+    """解析查询的 preference_constraint（字符串或已解析的 dict），缺失或格式错误时返回 None。"""
+    if isinstance(value, dict):
+        return value
+    try:
+        preference = ast.literal_eval(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+    return preference if isinstance(preference, dict) else None
+
+
+class TripValidator:
+    """单个城市的计划校验器：景点/餐厅/酒店名称集合只加载一次，之后对任意多个计划运行全部约束检查。"""
+
+    def __init__(self, city_en, base_dir=None):
+        self.city_en = city_en
+        base_dir = base_dir or DATABASE_DIR
+        self.attractions = NameIndex(city_en, 'attraction', base_dir).as_set()
+        self.restaurants = NameIndex(city_en, 'restaurant', base_dir).as_set()
+        self.hotels = NameIndex(city_en, 'hotel', base_dir).as_set()
+
+    def commonsense_constraints(self, query_data, plan):
+        return {
+            "is_valid_fields": is_valid_fields(plan),
+            "is_valid_days": is_valid_days(query_data, plan),
+            "is_valid_attractions": is_valid_attractions(plan, self.attractions),
+            "is_valid_restaurants": is_valid_restaurants(plan, self.restaurants),
+            "is_valid_accommodations": is_valid_accommodations(plan, self.hotels),
+            # "is_available_transportation": is_available_transportation(plan, self.city_en),
+            "is_no_repeated_attractions": is_no_repeated_attractions(plan),
+            "is_no_repeated_restaurants": is_no_repeated_restaurants(plan),
+        }
+
+    def preference_constraint(self, query_data, plan):
+        preference = parse_preference(query_data.get('preference_constraint'))
+        if preference is None:  # 约束无法解析：必有的预算约束记为失败，可选的菜系/酒店偏好视为满足
+            return {
+                "is_reasonable_budget": (False, "Invalid Preference Constraint"),
+                "is_favorite_cuisine": (True, None),
+                "is_preferred_hotel_type": (True, None),
+            }
+        return {
+            "is_reasonable_budget": is_reasonable_budget(preference, plan),
+            "is_favorite_cuisine": is_favorite_cuisine(preference, plan),
+            "is_preferred_hotel_type": is_preferred_hotel_type(preference, plan),
+        }
+
+    def check(self, query_data, plan):
+        if not plan:
+            return {'commonsense': None, 'preference': None}
+        return {'commonsense': self.commonsense_constraints(query_data, plan),
+                'preference': self.preference_constraint(query_data, plan)}
+
+    def check_batch(self, query_records, plans):
+        assert len(query_records) == len(plans)
+        return [self.check(query_data, plan) for query_data, plan in zip(query_records, plans)]
+
+
+@lru_cache(maxsize=None)
+def get_validator(city_en, base_dir):
+    return TripValidator(city_en, base_dir)
 
 
 def micro_pass_rate(plan_checkouts, typ):
@@ -229,50 +264,57 @@ def final_pass_rate(plan_checkouts):
     return pass_plan_count / all_plan_count
 
 
-def evaluation(query_records, plans, city_en):
-    delivery_cnt = 0
-    plan_checkouts = []
-
-    commonsense_failure_stat = defaultdict(lambda: {'fail_count': 0, 'reasons': []})
-    preference_failure_stat = defaultdict(lambda: {'fail_count': 0, 'reasons': []})
-
-    assert len(query_records) == len(plans)
-    for idx in range(len(query_records)):
-        query_data = query_records[idx]
-        plan = plans[idx]
-        if not plan:
-            plan_checkouts.append({'commonsense': None, 'preference': None})
-            continue
+def to_pending_plans(generated_plans):
+    pending_plans = []
+    for k, v in generated_plans.items():
+        if v == "":
+            plan_dict = []
+        else:
+            plan_dict = v
+            if isinstance(plan_dict, dict):
+                plan_dict = [plan_dict]
+        pending_plans.append(plan_dict)
+    return pending_plans
 
-        delivery_cnt += 1
-        commonsense = commonsense_constraints(query_data, plan, city_en)
-        preference = preference_constraint(query_data, plan)
 
-        for k, v in commonsense.items():
+def failure_stat(plan_checkouts, typ):
+    stat = {}
+    for plan_chk in plan_checkouts:
+        for k, v in (plan_chk[typ] or {}).items():
             if not v[0]:
-                commonsense_failure_stat[k]['fail_count'] += 1
-                commonsense_failure_stat[k]['reasons'].append(v[1])
+                item = stat.setdefault(k, {'fail_count': 0, 'reasons': {}})
+                item['fail_count'] += 1
+                item['reasons'][v[1]] = item['reasons'].get(v[1], 0) + 1
+    return stat
+
+
+def summarize_checkouts(plans, plan_checkouts):
+    return {
+        "delivery_rate": sum(bool(plan) for plan in plans) / len(plans),
+        "commonsense_micro": micro_pass_rate(plan_checkouts, typ='commonsense'),
+        "commonsense_macro": macro_pass_rate(plan_checkouts, typ='commonsense'),
+        "preference_micro": micro_pass_rate(plan_checkouts, typ='preference'),
+        "preference_macro": macro_pass_rate(plan_checkouts, typ='preference'),
+        "final_pass_rate": final_pass_rate(plan_checkouts),
+        "commonsense_failure_stat": failure_stat(plan_checkouts, 'commonsense'),
+        "preference_failure_stat": failure_stat(plan_checkouts, 'preference'),
+    }
 
-        for k, v in preference.items():
-            if not v[0]:
-                preference_failure_stat[k]['fail_count'] += 1
-                preference_failure_stat[k]['reasons'].append(v[1])
 
-        plan_checkouts.append({'commonsense': commonsense, 'preference': preference})
+def print_metrics(result):
+    print(f"\n✅ Delivery Rate: {result['delivery_rate']:.2%}")
+    print(f"✅ Commonsense Constraint Micro Pass Rate: {result['commonsense_micro']:.2%}")
+    print(f"✅ Commonsense Constraint Macro Pass Rate: {result['commonsense_macro']:.2%}")
+    print(f"✅ Preference Constraint Micro Pass Rate: {result['preference_micro']:.2%}")
+    print(f"✅ Preference Constraint Macro Pass Rate: {result['preference_macro']:.2%}")
+    print(f"✅ Final Pass Rate: {result['final_pass_rate']:.2%}")
 
-    dr = delivery_cnt / len(query_records)
-    cpr_mi = micro_pass_rate(plan_checkouts, typ='commonsense')
-    cpr_ma = macro_pass_rate(plan_checkouts, typ='commonsense')
-    ppr_mi = micro_pass_rate(plan_checkouts, typ='preference')
-    ppr_ma = macro_pass_rate(plan_checkouts, typ='preference')
-    fpr = final_pass_rate(plan_checkouts)
 
-    print(f"\n✅ Delivery Rate: {dr:.2%}")
-    print(f"✅ Commonsense Constraint Micro Pass Rate: {cpr_mi:.2%}")
-    print(f"✅ Commonsense Constraint Macro Pass Rate: {cpr_ma:.2%}")
-    print(f"✅ Preference Constraint Micro Pass Rate: {ppr_mi:.2%}")
-    print(f"✅ Preference Constraint Macro Pass Rate: {ppr_ma:.2%}")
-    print(f"✅ Final Pass Rate: {fpr:.2%}")
+def evaluation(query_records, plans, city_en):
+    plan_checkouts = get_validator(city_en, DATABASE_DIR).check_batch(query_records, plans)
+    result = summarize_checkouts(plans, plan_checkouts)
+    print_metrics(result)
+    return result
 
 
 if __name__ == '__main__':
@@ -283,20 +325,12 @@ if __name__ == '__main__':
     city_en = args.city_en
 
     model_name = f'citygpt-travel-{city_en}'
-    query_df = pd.read_csv(f'../database/{city_en}/travel_queries.csv', index_col=None, header=0)
+    query_df = pd.read_csv(f'{DATABASE_DIR}/{city_en}/travel_queries.csv', index_col=None, header=0)
     query_list = query_df.to_dict(orient='records')
     with open(f'../output/{city_en}/{model_name}/generated_plans.json', 'r', encoding='utf-8') as file:
         generated_plans = json.load(file)
 
-    pending_plans = []
-    for k, v in generated_plans.items():
-        if v == "":
-            plan_dict = []
-        else:
-            plan_dict = v
-            if isinstance(plan_dict, dict):
-                plan_dict = [plan_dict]
-        pending_plans.append(plan_dict)
+    pending_plans = to_pending_plans(generated_plans)
 
     evaluation(query_list, pending_plans, city_en)
 